@@ -0,0 +1,644 @@
+"""
+Small benchmark harness: register functions with a decorator, sweep their parameters,
+and report repeated timings as median / IQR / min, optionally saved as JSON.
+
+Example
+-------
+    from tony_util.benchmark import benchmark, run_suite, print_report
+
+    @benchmark('sorting', n=[1000, 100000])
+    def sort_random(n):
+        sorted(random.random() for _ in range(n))
+
+    print_report(run_suite('sorting', repeat=7))
+
+Run registered suites from the command line with
+    python -m tony_util.benchmark tony_util.timing_profiling --repeat 7 --json results.json
+
+Append each run to a results store (keyed by git commit and machine) and flag slowdowns with
+    python -m tony_util.benchmark tony_util.timing_profiling --store benchmarks.jsonl
+    python -m tony_util.benchmark compare benchmarks.jsonl --threshold 0.05
+compare exits with status 1 if a benchmark is significantly slower than the baseline.
+
+Created by: Tony Held tony.held@gmail.com
+Created on: 2021-03-10
+Copyright © 2021 Tony Held.  All rights reserved.
+"""
+
+import argparse
+import ast
+import gc
+import importlib
+import hashlib
+import itertools
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+
+# suite name -> {benchmark name -> Benchmark}, filled by the benchmark decorator
+suites = {}
+
+
+@dataclass
+class Benchmark:
+    """A registered benchmark function and the parameter values it is swept over."""
+    suite: str
+    name: str
+    func: callable
+    params: dict = field(default_factory=dict)
+    elements: str = None
+    nbytes: callable = None
+
+    def param_grid(self, params=None):
+        """List of keyword argument dicts, the cartesian product of the parameter values.
+
+        Parameters
+        ----------
+        params : dict
+            {parameter name: list of values} overriding the registered values
+        """
+        params = {**self.params, **(params or {})}
+        names = list(params)
+        return [dict(zip(names, values)) for values in itertools.product(*(params[n] for n in names))]
+
+
+def benchmark(suite='default', name=None, elements=None, nbytes=None, **params):
+    """Decorator registering a function in a benchmark suite.
+
+    Parameters
+    ----------
+    suite : str
+        Name of the suite the function belongs to
+    name : str
+        Name of the benchmark, the function name if None
+    elements : str
+        Name of the parameter giving the number of elements processed,
+        used to report memory per element (see measure_memory)
+    nbytes : callable
+        nbytes(**params) = bytes read and written by one call, used to report throughput in GB/s
+    **params :
+        Parameter name = list of values to sweep, passed to the function as keyword arguments
+
+    Returns
+    -------
+    The function, unchanged
+    """
+    def register(func):
+        bench_name = name or func.__name__
+        suites.setdefault(suite, {})[bench_name] = Benchmark(suite, bench_name, func,
+                                                             {k: list(v) for k, v in params.items()}, elements, nbytes)
+        return func
+    return register
+
+
+def summarize(samples):
+    """Summary statistics (seconds) of a list of timing samples."""
+    q1, median, q3 = statistics.quantiles(samples, n=4) if len(samples) > 1 else samples * 3
+    return {'median': median, 'q1': q1, 'q3': q3, 'iqr': q3 - q1, 'min': min(samples), 'max': max(samples),
+            'mean': statistics.fmean(samples)}
+
+
+def time_call(func, kwargs, number=1, disable_gc=True):
+    """Seconds per call of func(**kwargs), averaged over number consecutive calls.
+
+    Garbage is collected before timing and, if disable_gc, the collector is disabled while timing
+    so a collection triggered by earlier allocations doesn't land in the sample.
+    """
+    gc.collect()
+    gc_was_enabled = gc.isenabled()
+    if disable_gc:
+        gc.disable()
+    try:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func(**kwargs)
+        elapsed = time.perf_counter() - t0
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return elapsed / number
+
+
+def current_rss():
+    """Resident set size of this process in bytes, None if it can't be read.
+    Reads /proc on Linux and falls back to psutil if it is installed."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def measure_memory(func, kwargs):
+    """Memory used by one call of func(**kwargs), measured with tracemalloc (untimed, tracing is slow).
+
+    Returns
+    -------
+    memory : dict
+        peak_bytes : highest traced memory during the call, above the memory in use before it
+        retained_bytes, retained_blocks : memory and number of memory blocks still alive when the call
+            returned, i.e. referenced by the return value (the benchmark should return the data it built
+            for these to be meaningful).  This is not a count of the allocations made during the call:
+            blocks that were allocated and freed inside the call are not counted, tracemalloc only tracks
+            live blocks.
+        rss_delta : growth of the process resident set size while the return value is alive, measured
+            in a separate call without tracing, None if unavailable.  It includes memory the allocator
+            kept after the call freed it, and is 0 when the call reused memory the process already had.
+    """
+    gc.collect()
+    rss0 = current_rss()
+    result = func(**kwargs)
+    rss1 = current_rss()
+    del result
+    gc.collect()
+
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        start_bytes = tracemalloc.get_traced_memory()[0]
+        result = func(**kwargs)
+        peak_bytes = tracemalloc.get_traced_memory()[1] - start_bytes
+        after = tracemalloc.take_snapshot()
+        differences = after.compare_to(before, 'filename')
+        del result
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return {'peak_bytes': peak_bytes,
+            'retained_bytes': sum(d.size_diff for d in differences),
+            'retained_blocks': sum(d.count_diff for d in differences),
+            'rss_delta': None if rss0 is None or rss1 is None else rss1 - rss0}
+
+
+def run_benchmark(bench, params=None, warmup=1, repeat=5, number=1, disable_gc=True, memory=False):
+    """Time a benchmark for every point of its parameter grid.
+
+    Parameters
+    ----------
+    bench : Benchmark
+        Benchmark to run
+    params : dict
+        {parameter name: list of values} overriding the registered sweep
+    warmup : int
+        Untimed calls made before the samples at each parameter point
+    repeat : int
+        Number of timing samples at each parameter point
+    number : int
+        Calls averaged into each sample, increase for functions that take microseconds
+    disable_gc : bool
+        Disable the garbage collector while timing
+    memory : bool
+        Make one more call per parameter point to measure memory (see measure_memory)
+
+    Returns
+    -------
+    results : list of dict
+        One dict per parameter point with the suite, benchmark, params, samples (seconds per call),
+        summary statistics (see summarize), the run settings, and if memory is True a memory dict
+        (see measure_memory) with the values also divided by the number of elements
+    """
+    results = []
+    for kwargs in bench.param_grid(params):
+        for _ in range(warmup):
+            bench.func(**kwargs)
+        samples = [time_call(bench.func, kwargs, number, disable_gc) for _ in range(repeat)]
+        result = {'suite': bench.suite, 'benchmark': bench.name, 'params': kwargs, 'samples': samples,
+                  **summarize(samples),
+                  'warmup': warmup, 'repeat': repeat, 'number': number, 'disable_gc': disable_gc}
+        if bench.nbytes:
+            result['gb_per_s'] = bench.nbytes(**kwargs) / result['median'] / 1e9
+        if memory:
+            result['memory'] = measure_memory(bench.func, kwargs)
+            n_elements = kwargs.get(bench.elements) if bench.elements else None
+            if n_elements:
+                result['memory'].update({f'{k}_per_element': v / n_elements
+                                         for k, v in list(result['memory'].items()) if v is not None})
+        results.append(result)
+    return results
+
+
+def run_suite(suite, names=None, params=None, print_=False, **kwargs):
+    """Run the benchmarks of a suite in registration order.
+
+    Parameters
+    ----------
+    suite : str
+        Name of the suite
+    names : iterable of str
+        Only run these benchmarks, all benchmarks of the suite if None
+    params : dict
+        {parameter name: list of values} overriding the registered sweep of every benchmark
+        that has that parameter
+    print_ : bool
+        Print each benchmark's results as it finishes
+    **kwargs :
+        warmup, repeat, number, disable_gc, memory (see run_benchmark)
+
+    Returns
+    -------
+    results : list of dict
+        See run_benchmark
+    """
+    if suite not in suites:
+        raise KeyError(f'Unknown benchmark suite {suite!r}, registered suites: {sorted(suites)}')
+    results = []
+    baselines = {}
+    for name, bench in suites[suite].items():
+        if names is not None and name not in names:
+            continue
+        overrides = {k: v for k, v in (params or {}).items() if k in bench.params}
+        bench_results = run_benchmark(bench, overrides, **kwargs)
+        if print_:
+            print_report(bench_results, header=False, baselines=baselines)
+            if kwargs.get('memory'):
+                print_memory_report(bench_results, header=False)
+        results.extend(bench_results)
+    return results
+
+
+def format_params(params):
+    """Compact text of a params dict, e.g. 'array_size=1000'."""
+    return ', '.join(f'{k}={v}' for k, v in params.items())
+
+
+REPORT_HEADER = f'{"benchmark":40s} {"params":25s} {"median":>10s} {"IQR":>10s} {"min":>10s} {"speedup":>8s}'
+
+
+def print_report(results, header=True, baselines=None):
+    """Print median, IQR, and min (seconds) of each result.  The speedup column compares each benchmark
+    with the first benchmark of its suite run at the same parameters (ratio of medians, >1 is faster),
+    followed by the throughput of benchmarks registered with nbytes.
+
+    baselines : dict
+        Baseline medians, shared between calls when a report is printed in pieces
+    """
+    if header:
+        print(REPORT_HEADER)
+    baselines = {} if baselines is None else baselines
+    for r in results:
+        key = (r['suite'], json.dumps(r['params'], sort_keys=True, default=str))
+        baseline = baselines.setdefault(key, r['median'])
+        print(f'{r["suite"] + "." + r["benchmark"]:40s} {format_params(r["params"]):25s} '
+              f'{r["median"]:10.4g} {r["iqr"]:10.4g} {r["min"]:10.4g} {baseline / r["median"]:8.2f}'
+              + (f' {r["gb_per_s"]:8.2f} GB/s' if 'gb_per_s' in r else ''))
+
+
+MEMORY_HEADER = (f'{"  memory":40s} {"":25s} {"peak MB":>10s} {"kept MB":>10s} {"RSS MB":>10s} '
+                 f'{"kept B/el":>9s} {"kept blk/el":>11s}')
+
+
+def print_memory_report(results, header=True):
+    """Print the memory measurements of results run with memory=True: peak traced memory,
+    memory retained by the return value, RSS growth, and retained bytes and live blocks per element
+    (blocks still referenced after the call, not the number of allocations made by it)."""
+    if header:
+        print(MEMORY_HEADER)
+    for r in results:
+        m = r.get('memory')
+        if not m:
+            continue
+        rss = f'{m["rss_delta"] / 1e6:10.3f}' if m['rss_delta'] is not None else f'{"n/a":>10s}'
+        per_element = (f'{m["retained_bytes_per_element"]:9.2f} {m["retained_blocks_per_element"]:11.3f}'
+                       if 'retained_bytes_per_element' in m else f'{"":9s} {"":11s}')
+        print(f'{"  " + r["benchmark"]:40s} {format_params(r["params"]):25s} {m["peak_bytes"] / 1e6:10.3f} '
+              f'{m["retained_bytes"] / 1e6:10.3f} {rss} {per_element}')
+
+
+def write_json(results, file_name):
+    """Save results to a JSON file, a list of dicts as returned by run_suite."""
+    with open(file_name, 'w') as f:
+        json.dump(results, f, indent=1, default=str)
+
+
+def read_json(file_name):
+    """Load results saved by write_json."""
+    with open(file_name) as f:
+        return json.load(f)
+
+
+def git_commit(path=None):
+    """Hash of the git HEAD of the repository containing path (the current directory if None),
+    with a '-dirty' suffix if there are uncommitted changes.  None outside a git repository."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=path, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=path,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + '-dirty' if status.strip() else commit
+
+
+def machine_info():
+    """Description of the machine and interpreter, the timings of different machines aren't comparable."""
+    return {'node': platform.node(), 'machine': platform.machine(), 'processor': platform.processor(),
+            'system': platform.system(), 'cpu_count': os.cpu_count(),
+            'python': platform.python_implementation() + ' ' + platform.python_version()}
+
+
+def machine_fingerprint(info=None):
+    """Short hash of machine_info()."""
+    info = info or machine_info()
+    return hashlib.sha1(json.dumps(info, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def result_key(result):
+    """(suite, benchmark, params) key identifying what a result measured."""
+    return result['suite'], result['benchmark'], json.dumps(result['params'], sort_keys=True, default=str)
+
+
+class ResultStore:
+    """Append only JSON lines file of benchmark results, one line per result,
+    tagged with the git commit, machine fingerprint, and time of the run."""
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+
+    def append(self, results, commit=None, machine=None):
+        """Add results (list of dicts from run_suite) to the store.
+
+        Parameters
+        ----------
+        results : list of dict
+            Results to store
+        commit : str
+            Commit of the code that was benchmarked, git_commit() if None
+        machine : dict
+            Machine description, machine_info() if None
+        """
+        commit = commit or git_commit() or 'unknown'
+        machine = machine or machine_info()
+        tags = {'commit': commit, 'machine': machine_fingerprint(machine), 'machine_info': machine,
+                'timestamp': time.time()}
+        with open(self.file_name, 'a') as f:
+            for r in results:
+                f.write(json.dumps({**r, **tags}, default=str) + '\n')
+
+    def load(self, commit=None, machine=None):
+        """Stored results, optionally only those of a commit and/or machine fingerprint."""
+        if not os.path.exists(self.file_name):
+            return []
+        with open(self.file_name) as f:
+            results = [json.loads(line) for line in f if line.strip()]
+        return [r for r in results
+                if (commit is None or r['commit'] == commit) and (machine is None or r['machine'] == machine)]
+
+    def commits(self, machine=None):
+        """Commits in the store in the order they were first benchmarked."""
+        return list(dict.fromkeys(r['commit'] for r in self.load(machine=machine)))
+
+
+def mann_whitney_u(x, y):
+    """One-sided Mann-Whitney U test that the values of y tend to be larger than those of x.
+
+    The p-value is exact when there are no ties and both samples are small,
+    otherwise it uses the normal approximation with tie and continuity corrections.
+
+    Parameters
+    ----------
+    x, y : sequence of float
+        Independent samples, e.g. baseline and candidate timings
+
+    Returns
+    -------
+    (u, p_value) : (float, float)
+        u counts the pairs with y > x (ties count half)
+    """
+    n1, n2 = len(x), len(y)
+    if not n1 or not n2:
+        return math.nan, math.nan
+    # average ranks of the pooled samples
+    pooled = sorted([(v, 0) for v in x] + [(v, 1) for v in y])
+    ranks = [0.0] * len(pooled)
+    tie_sizes = []
+    i = 0
+    while i < len(pooled):
+        j = i
+        while j + 1 < len(pooled) and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        tie_sizes.append(j - i + 1)
+        i = j + 1
+    rank_sum_y = sum(r for r, (_, group) in zip(ranks, pooled) if group == 1)
+    u = rank_sum_y - n2 * (n2 + 1) / 2
+
+    if max(tie_sizes) == 1 and n1 + n2 <= 40:
+        counts = mann_whitney_counts(n1, n2)
+        return u, sum(counts[math.ceil(u):]) / math.comb(n1 + n2, n1)
+
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - sum(t ** 3 - t for t in tie_sizes) / (n * (n - 1)))
+    if variance == 0:
+        return u, 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return u, 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def mann_whitney_counts(n1, n2):
+    """Number of orderings of n1 x's and n2 y's for each value of U (pairs with y > x)."""
+    # table[i][j] = counts for i x's and j y's, the largest value is either a y (adds i to U) or an x
+    table = [[[1] for _ in range(n2 + 1)] for _ in range(n1 + 1)]
+    for i in range(1, n1 + 1):
+        for j in range(1, n2 + 1):
+            last_y, last_x = table[i][j - 1], table[i - 1][j]
+            counts = [0] * (i * j + 1)
+            for k, c in enumerate(last_y):
+                counts[k + i] += c
+            for k, c in enumerate(last_x):
+                counts[k] += c
+            table[i][j] = counts
+    return table[n1][n2]
+
+
+def compare(baseline, candidate, alpha=0.05, threshold=0.05):
+    """Compare the timings of two sets of results, matched by suite, benchmark, and params.
+
+    Samples of repeated results with the same key (e.g. several runs of one commit) are pooled.
+
+    Parameters
+    ----------
+    baseline, candidate : list of dict
+        Results as returned by run_suite or ResultStore.load
+    alpha : float
+        Significance level of the one-sided Mann-Whitney test
+    threshold : float
+        Relative change of the median that matters, 0.05 = 5 %
+
+    Returns
+    -------
+    comparisons : list of dict
+        suite, benchmark, params, baseline and candidate medians, ratio (candidate / baseline),
+        p_slower, p_faster, and status: 'slower' (significant and ratio > 1 + threshold),
+        'faster' (significant and ratio < 1 - threshold), or 'same'
+    """
+    def pool(results):
+        pooled = {}
+        for r in results:
+            pooled.setdefault(result_key(r), (r, []))[1].extend(r['samples'])
+        return pooled
+
+    base, cand = pool(baseline), pool(candidate)
+    comparisons = []
+    for key, (r, cand_samples) in cand.items():
+        if key not in base:
+            continue
+        base_samples = base[key][1]
+        base_median, cand_median = statistics.median(base_samples), statistics.median(cand_samples)
+        ratio = cand_median / base_median if base_median else math.inf
+        p_slower = mann_whitney_u(base_samples, cand_samples)[1]
+        p_faster = mann_whitney_u(cand_samples, base_samples)[1]
+        if p_slower < alpha and ratio > 1 + threshold:
+            status = 'slower'
+        elif p_faster < alpha and ratio < 1 - threshold:
+            status = 'faster'
+        else:
+            status = 'same'
+        comparisons.append({'suite': r['suite'], 'benchmark': r['benchmark'], 'params': r['params'],
+                            'baseline': base_median, 'candidate': cand_median, 'ratio': ratio,
+                            'p_slower': p_slower, 'p_faster': p_faster, 'status': status})
+    return comparisons
+
+
+def print_comparison(comparisons):
+    """Print the output of compare, one line per benchmark and parameter point."""
+    print(f'{"benchmark":40s} {"params":25s} {"baseline":>10s} {"candidate":>10s} {"ratio":>7s} '
+          f'{"p":>7s}  status')
+    for c in comparisons:
+        p = c['p_slower'] if c['ratio'] >= 1 else c['p_faster']
+        print(f'{c["suite"] + "." + c["benchmark"]:40s} {format_params(c["params"]):25s} '
+              f'{c["baseline"]:10.4g} {c["candidate"]:10.4g} {c["ratio"]:7.3f} {p:7.3g}  {c["status"]}')
+
+
+def load_results(source, store=None, machine=None):
+    """Results from a JSON file written by write_json, or of a commit in the store."""
+    if source.endswith('.json') and os.path.exists(source):
+        return read_json(source)
+    if store is None:
+        raise ValueError(f'{source!r} is not a JSON results file and no store was given')
+    matches = [c for c in store.commits(machine) if c.startswith(source)]
+    if len(matches) != 1:
+        raise ValueError(f'{source!r} matches {len(matches)} commits in {store.file_name}')
+    return store.load(matches[0], machine)
+
+
+def compare_main(argv=None):
+    """Command line comparison of two benchmark runs, returns the process exit status
+    (1 if any benchmark is significantly slower, 0 otherwise)."""
+    parser = argparse.ArgumentParser(prog='python -m tony_util.benchmark compare',
+                                     description='Flag statistically significant benchmark slowdowns.')
+    parser.add_argument('store', help='JSON lines results store')
+    parser.add_argument('--baseline', help='Commit (or prefix) or JSON results file, '
+                                           'the commit before the candidate if omitted')
+    parser.add_argument('--candidate', help='Commit (or prefix) or JSON results file, '
+                                            'the last commit in the store if omitted')
+    parser.add_argument('--machine', help='Machine fingerprint, the current machine if omitted, "any" for all')
+    parser.add_argument('--alpha', type=float, default=0.05, help='Significance level')
+    parser.add_argument('--threshold', type=float, default=0.05, help='Relative slowdown that fails, 0.05 = 5%%')
+    args = parser.parse_args(argv)
+
+    store = ResultStore(args.store)
+    machine = None if args.machine == 'any' else args.machine or machine_fingerprint()
+    commits = store.commits(machine)
+    candidate = args.candidate or (commits[-1] if commits else None)
+    if candidate is None:
+        parser.error(f'No results for machine {machine} in {args.store}')
+    if args.baseline:
+        baseline = args.baseline
+    else:
+        earlier = commits[:commits.index(candidate)] if candidate in commits else commits[:-1]
+        if not earlier:
+            parser.error('No baseline commit before the candidate in the store')
+        baseline = earlier[-1]
+
+    print(f'Baseline {baseline}, candidate {candidate}, machine {machine or "any"}')
+    try:
+        baseline_results, candidate_results = (load_results(source, store, machine)
+                                               for source in (baseline, candidate))
+    except ValueError as e:
+        parser.error(str(e))
+    comparisons = compare(baseline_results, candidate_results, args.alpha, args.threshold)
+    print_comparison(comparisons)
+    slower = [c for c in comparisons if c['status'] == 'slower']
+    if slower:
+        print(f'{len(slower)} significant slowdown(s) over {args.threshold:.0%}')
+    return 1 if slower else 0
+
+
+def parse_param(text):
+    """Parse a command line parameter sweep 'name=v1,v2,...' into (name, [values]).
+    Values are python literals when possible and strings otherwise.
+    Whole floats such as 1e6 become ints so sizes can be written in scientific notation."""
+    name, _, values = text.partition('=')
+    parsed = []
+    for v in values.split(','):
+        try:
+            v = ast.literal_eval(v)
+        except (ValueError, SyntaxError):
+            pass
+        parsed.append(int(v) if isinstance(v, float) and v.is_integer() else v)
+    return name, parsed
+
+
+def main(argv=None):
+    """Command line entry point, see python -m tony_util.benchmark --help
+    and python -m tony_util.benchmark compare --help."""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['compare']:
+        sys.exit(compare_main(argv[1:]))
+
+    parser = argparse.ArgumentParser(description='Run registered benchmark suites.')
+    parser.add_argument('modules', nargs='*', help='Modules to import, registering their benchmarks')
+    parser.add_argument('--suite', action='append', help='Suite to run (repeatable), all suites if omitted')
+    parser.add_argument('--bench', action='append', help='Benchmark to run (repeatable), all if omitted')
+    parser.add_argument('--param', action='append', default=[], type=parse_param,
+                        help='Override a parameter sweep, e.g. --param array_size=1000,1e5')
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=1)
+    parser.add_argument('--keep-gc', action='store_true', help='Leave the garbage collector enabled while timing')
+    parser.add_argument('--memory', action='store_true', help='Also measure memory with tracemalloc and RSS')
+    parser.add_argument('--json', help='Save the results to this JSON file')
+    parser.add_argument('--store', help='Append the results to this JSON lines store (see ResultStore)')
+    parser.add_argument('--commit', help='Commit recorded in the store, the git HEAD if omitted')
+    args = parser.parse_args(argv)
+
+    for module in args.modules:
+        importlib.import_module(module)
+    params = dict(args.param)
+
+    results = []
+    print(REPORT_HEADER)
+    if args.memory:
+        print(MEMORY_HEADER)
+    for suite in args.suite or list(suites):
+        results.extend(run_suite(suite, args.bench, params, print_=True, warmup=args.warmup, repeat=args.repeat,
+                                 number=args.number, disable_gc=not args.keep_gc, memory=args.memory))
+    if args.json:
+        write_json(results, args.json)
+        print(f'Results saved to {args.json}')
+    if args.store:
+        ResultStore(args.store).append(results, args.commit)
+        print(f'Results appended to {args.store}')
+    return results
+
+
+if __name__ == '__main__':
+    # benchmark modules register in the imported tony_util.benchmark, not in this __main__ copy
+    from tony_util.benchmark import main
+    main()
@@ -5,9 +5,170 @@ Created by: Tony Held tony.held@gmail.com
 Created on: 2021-02-10
 Copyright © 2021 Tony Held.  All rights reserved.
 """
+import asyncio
+import html
+import inspect
+import socketserver
+import threading
+import types
+from urllib.parse import parse_qs
+from wsgiref.simple_server import make_server, WSGIServer
+from tony_util.misc import bounded_repr
 
+# (type, attribute name) of computed attributes that exceeded a time budget, see iter_values
+slow_attributes = set()
 
-def values(var, mode='plain-text', exclude_starting_with='_', print_=True):
+
+def is_computed(var, name):
+    """True if attribute name of var is computed on access (a property or other user defined descriptor),
+    rather than stored on the object or a plain method."""
+    static = inspect.getattr_static(type(var), name, None)
+    return isinstance(static, property) or \
+        (hasattr(type(static), '__get__') and type(static).__module__ != 'builtins')
+
+
+def getattr_with_budget(var, name, time_budget):
+    """getattr(var, name), evaluated on a daemon thread if it takes longer than time_budget seconds.
+
+    Returns
+    -------
+    finished : bool
+        False if the time budget was exceeded.  The evaluation keeps running in the background.
+    value :
+        Attribute value (or the exception raised by getattr) if finished
+    """
+    result = []
+
+    def evaluate():
+        try:
+            result.append(getattr(var, name))
+        except Exception as e:
+            result.append(e)
+
+    thread = threading.Thread(target=evaluate, name=f'getattr {name}', daemon=True)
+    thread.start()
+    thread.join(time_budget)
+    if not result:
+        return False, None
+    if isinstance(result[0], Exception):
+        raise result[0]
+    return True, result[0]
+
+
+def iter_attributes(var, exclude_starting_with='_', time_budget=None):
+    """Lazily yield (attribute name, value, problem) for a variable's attributes.
+
+    problem is None if the value was evaluated, otherwise a description of why it wasn't
+    (exception raised or time budget exceeded) and value is None.
+    See iter_values for the parameters.
+    """
+    for name in dir(var):
+        if exclude_starting_with and name.startswith(exclude_starting_with):
+            continue
+        try:
+            if time_budget is not None and is_computed(var, name):
+                if (type(var), name) in slow_attributes:
+                    yield name, None, f'<skipped, exceeded the {time_budget} s time budget previously>'
+                    continue
+                finished, value = getattr_with_budget(var, name, time_budget)
+                if not finished:
+                    slow_attributes.add((type(var), name))
+                    yield name, None, f'<skipped, exceeded the {time_budget} s time budget>'
+                    continue
+            else:
+                value = getattr(var, name)
+        except Exception as e:
+            yield name, None, f'<{type(e).__name__} raised: {e}>'
+            continue
+        yield name, value, None
+
+
+def render(value, max_char=None):
+    """Convert an attribute value to text, bounded to max_char characters if max_char is not None."""
+    if max_char is not None:
+        return bounded_repr(value, max_char, output_mode='!s')
+    return str(value)
+
+
+def iter_values(var, exclude_starting_with='_', time_budget=None, max_char=None):
+    """Lazily yield (attribute name, rendered value) for a variable's attributes.
+
+    Each attribute is only evaluated when its pair is requested,
+    so a caller that stops early doesn't pay for the remaining attributes.
+
+    Parameters
+    -----------
+    var :
+        variable to inspect using the dir and getattr functions
+
+    exclude_starting_with : str
+        Pattern to exclude from inspection of dir output (see values).
+
+    time_budget : float
+        Seconds allowed to evaluate each computed attribute (property or other descriptor).
+        Attributes that exceed it are rendered as skipped, and the attribute is skipped for
+        every object of the same type afterwards.  None evaluates everything without a limit.
+
+    max_char : int
+        Maximum number of characters of each rendered value (see misc.bounded_repr).
+        None renders the full value with str.
+
+    Yields
+    -----------
+    (name, text) : (str, str)
+    """
+    for name, value, problem in iter_attributes(var, exclude_starting_with, time_budget):
+        yield name, problem if problem is not None else render(value, max_char)
+
+
+def iter_text(var, mode='plain-text', exclude_starting_with='_', time_budget=None, max_char=None):
+    """Lazily yield the pieces of the values report, one piece per attribute.
+
+    See values for the parameters.
+    """
+    mytype = type(var)
+    if mode == 'plain-text':
+        yield f'Variable type: {mytype}\n'
+    else:
+        yield f'Variable type: {html.escape(str(mytype))}<br>'
+
+    for i, value in iter_values(var, exclude_starting_with, time_budget, max_char):
+        if mode == 'plain-text':
+            yield f'\n{i}:\n{"-" * 20}\n{value}\n'
+        else:
+            yield f'<hr>{html.escape(i)}:<br>{"-" * 20}<br><pre>{html.escape(value)}</pre>'
+
+
+def write_values(var, file, mode='plain-text', exclude_starting_with='_', time_budget=None, max_char=None,
+                 chunk_size=64 * 1024):
+    """Stream the values report to a file-like object as the attributes are evaluated.
+
+    Parameters
+    -----------
+    var, mode, exclude_starting_with, time_budget, max_char :
+        See values and iter_values.
+
+    file :
+        Object with a write method (open file, sys.stdout, io.StringIO, socket file, ...)
+
+    chunk_size : int
+        Pieces are collected and written once they reach chunk_size characters.
+        0 writes every piece as soon as it is ready.
+    """
+    pieces = []
+    size = 0
+    for piece in iter_text(var, mode, exclude_starting_with, time_budget, max_char):
+        pieces.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            file.write(''.join(pieces))
+            pieces.clear()
+            size = 0
+    if pieces:
+        file.write(''.join(pieces))
+
+
+def values(var, mode='plain-text', exclude_starting_with='_', print_=True, max_char=None, time_budget=None):
     """Show a variable's attributes and values for diagnostic debugging purposes.
 
     Parameters
@@ -18,7 +179,7 @@ def values(var, mode='plain-text', exclude_starting_with='_', print_=True):
     mode : str ("plain-text" | "html")
         mode determines what characters are used for line separation.
             plain-text '\n' is used
-            otherwise html is used
+            otherwise html is used (with escaped values, see iter_html for a full html page)
 
     exclude_starting_with : str
         Pattern to exclude from inspection of dir output.
@@ -29,36 +190,209 @@ def values(var, mode='plain-text', exclude_starting_with='_', print_=True):
     print_ : bool
         True to print, False to suppress output
 
+    max_char : int
+        Maximum number of characters shown per attribute value (see misc.bounded_repr).
+        None shows the full value.
+
+    time_budget : float
+        Seconds allowed to evaluate each property, slower properties are skipped (see iter_values).
+        None evaluates everything.
+
     Returns
     -----------
     text : str
         plain text or html string with variable attribute information.
 
+    Notes
+    -----------
+    This is a thin wrapper of iter_text.  Use write_values or iter_values to stream the report.
     """
-    text = ""
+    text = ''.join(iter_text(var, mode, exclude_starting_with, time_budget, max_char))
 
-    mytype = type(var)
+    if print_ is True:
+        print(text)
 
-    if mode == 'plain-text':
-        text += f'Variable type: {mytype}\n'
-    else:
-        text += f'Variable type: {strip_single_tag(mytype)}<br>'
+    return text
 
-    if exclude_starting_with:
-        attrs = [i for i in dir(var) if not i.startswith(exclude_starting_with)]
-    else:
-        attrs = [i for i in dir(var)]
 
-    for i in attrs:
-        if mode == 'plain-text':
-            text += f'\n{i}:\n{"-" * 20}\n{getattr(var, i)}\n'
-        else:
-            text += f'<hr>{i}:<br>{"-" * 20}<br>{strip_single_tag(getattr(var, i))}'
+HTML_HEAD = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body {{font-family: sans-serif; font-size: 14px;}}
+details {{margin-left: 1.5em; border-left: 1px solid #ccc; padding-left: 0.5em;}}
+summary {{cursor: pointer;}}
+pre {{margin: 0.2em 0 0.2em 1.5em; white-space: pre-wrap;}}
+.problem {{color: #a00;}}
+</style>
+<script>
+// load the attributes of a nested object the first time its section is opened
+document.addEventListener('toggle', function (event) {{
+    var lazy = event.target.querySelector(':scope > div.lazy');
+    if (event.target.open && lazy && !lazy.dataset.loaded) {{
+        lazy.dataset.loaded = '1';
+        fetch('?fragment=1&path=' + encodeURIComponent(lazy.dataset.path))
+            .then(function (response) {{ return response.text(); }})
+            .then(function (text) {{ lazy.innerHTML = text; }});
+    }}
+}}, true);
+</script>
+</head><body>
+"""
 
-    if print_ is True:
-        print(text)
 
-    return text
+def is_expandable(value):
+    """True if value is an object whose attributes are worth exploring in a nested section."""
+    return not callable(value) and (isinstance(value, types.ModuleType) or hasattr(value, '__dict__')
+                                    or hasattr(type(value), '__slots__'))
+
+
+def resolve_path(var, path, exclude_starting_with='_'):
+    """Follow a dotted attribute path (e.g. 'config.database') from var.
+    Attributes hidden from the report (see iter_attributes) can't be followed either,
+    AttributeError is raised for them as for missing attributes."""
+    for name in filter(None, path.split('.')):
+        if exclude_starting_with and name.startswith(exclude_starting_with):
+            raise AttributeError(f'{name!r} is excluded from the report')
+        var = getattr(var, name)
+    return var
+
+
+def iter_html(var, path='', exclude_starting_with='_', time_budget=None, max_char=None,
+              expand_depth=0, fragment=False, preview_char=80):
+    """Lazily yield the html of an attribute report, one chunk per attribute.
+
+    Every value is html escaped.  Each attribute is a collapsible section whose summary
+    shows the start of the value.  Attributes holding objects get a nested section with
+    their own attributes, rendered inline down to expand_depth levels and otherwise loaded
+    by the browser from the server when the section is opened (see make_wsgi_app).
+
+    Parameters
+    -----------
+    var :
+        variable to inspect
+    path : str
+        Dotted attribute path of var from the served root object ('' for the root)
+    exclude_starting_with, time_budget, max_char :
+        See iter_values.
+    expand_depth : int
+        Levels of nested objects rendered inline (0 to load all nested objects lazily)
+    fragment : bool
+        True to only yield the attribute sections, without the html document around them
+    preview_char : int
+        Characters of each value shown in its summary line
+    """
+    if not fragment:
+        yield HTML_HEAD.format(title=html.escape(f'{path or "root"}: {type(var).__name__}'))
+        yield f'<h3>Variable type: {html.escape(str(type(var)))}</h3>\n'
+
+    for name, value, problem in iter_attributes(var, exclude_starting_with, time_budget):
+        name_html = html.escape(name)
+        if problem is not None:
+            yield f'<div><b>{name_html}</b> <span class="problem">{html.escape(problem)}</span></div>\n'
+            continue
+
+        text = render(value, max_char)
+        preview = html.escape(text if len(text) <= preview_char else text[:preview_char] + ' ...')
+        expandable = is_expandable(value)
+        if len(text) <= preview_char and not expandable:
+            yield f'<div><b>{name_html}</b> = {preview}</div>\n'
+            continue
+
+        child_path = f'{path}.{name}' if path else name
+        chunk = [f'<details><summary><b>{name_html}</b> = {preview}</summary>'
+                 f'<pre>{html.escape(text)}</pre>']
+        if expandable and expand_depth > 0:
+            chunk.extend(iter_html(value, child_path, exclude_starting_with, time_budget, max_char,
+                                   expand_depth - 1, fragment=True, preview_char=preview_char))
+        elif expandable:
+            chunk.append(f'<div class="lazy" data-path="{html.escape(child_path)}"></div>')
+        chunk.append('</details>\n')
+        yield ''.join(chunk)
+
+    if not fragment:
+        yield '</body></html>\n'
+
+
+def make_wsgi_app(var, **options):
+    """WSGI application serving the html report of var as it is evaluated.
+
+    The response is an iterator of html chunks, so the first bytes reach the browser
+    while the remaining attributes are still being evaluated.
+    Requests with ?fragment=1&path=<dotted path> return the nested section of an attribute.
+
+    Parameters
+    -----------
+    var :
+        variable to inspect
+    **options :
+        Passed to iter_html (exclude_starting_with, time_budget, max_char, expand_depth ...)
+    """
+    def app(environ, start_response):
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+        path = query.get('path', [''])[0]
+        fragment = query.get('fragment', ['0'])[0] == '1'
+        try:
+            target = resolve_path(var, path, options.get('exclude_starting_with', '_'))
+        except Exception as e:
+            start_response('404 Not Found', [('Content-Type', 'text/plain; charset=utf-8')])
+            return [f'{type(e).__name__}: {e}'.encode()]
+        start_response('200 OK', [('Content-Type', 'text/html; charset=utf-8')])
+        return (chunk.encode() for chunk in iter_html(target, path, fragment=fragment, **options))
+    return app
+
+
+def make_asgi_app(var, **options):
+    """ASGI application equivalent to make_wsgi_app.  Attributes are evaluated on the default
+    executor so the event loop is not blocked, and each html chunk is sent as soon as it is ready."""
+    async def app(scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        query = parse_qs(scope.get('query_string', b'').decode())
+        path = query.get('path', [''])[0]
+        fragment = query.get('fragment', ['0'])[0] == '1'
+        loop = asyncio.get_running_loop()
+        try:
+            target = await loop.run_in_executor(None, resolve_path, var, path,
+                                                options.get('exclude_starting_with', '_'))
+        except Exception as e:
+            await send({'type': 'http.response.start', 'status': 404,
+                        'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+            await send({'type': 'http.response.body', 'body': f'{type(e).__name__}: {e}'.encode()})
+            return
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'text/html; charset=utf-8')]})
+        chunks = iter_html(target, path, fragment=fragment, **options)
+        while True:
+            chunk = await loop.run_in_executor(None, next, chunks, None)
+            if chunk is None:
+                break
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    return app
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    """WSGIServer that handles each request on its own thread,
+    so nested sections can load while the page is still streaming."""
+    daemon_threads = True
+
+
+def serve(var, host='127.0.0.1', port=8000, **options):
+    """Serve the html report of var at http://host:port until interrupted.
+
+    Parameters
+    -----------
+    var :
+        variable to inspect
+    host, port :
+        Address to listen on.  The report exposes the object's attributes, keep it on localhost.
+    **options :
+        Passed to iter_html
+    """
+    with make_server(host, port, make_wsgi_app(var, **options), server_class=ThreadingWSGIServer) as server:
+        print(f'Serving diagnostics of {type(var).__name__} at http://{host}:{server.server_port}')
+        server.serve_forever()
+
 
 def strip_single_tag(text):
     """Remove starting '<' and ending '>' from a string
@@ -5,7 +5,14 @@ Created by: Tony Held tony.held@gmail.com
 Created on: 2020-08-13
 Copyright © 2021 Tony Held.  All rights reserved.
 """
-from tony_util.misc import my_calling_statement, function_arguments, get_max_char
+import collections
+import heapq
+import json
+import sys
+import types
+import weakref
+
+from tony_util.misc import my_calling_statement, calling_arguments, bounded_repr
 
 
 class Inspector:
@@ -21,12 +28,38 @@ class Inspector:
         self.climb_history = {}    # Store inspections with object id as key
         self.children = {}         # Store parent child relationships among objects
         self.entry_id = 0          # Counter to retain order of dictionary insertions
+        self.visited_objects = {}  # Keep objects in climb_history alive so their ids are not reused
+        self.dir_cache = {}        # Class -> dir(class), see cached_dir
 
     def __call__(self, *args, **kwargs):
         """Call climb_dir if Inspector is directly called."""
-        self.climb_dir(*args, *kwargs)
+        self.climb_dir(*args, **kwargs)
+
+    def cached_dir(self, obj):
+        """dir(obj), with the class part of the result cached per class.
 
-    def climb_dir(self, obj, drilldown='__class__', max_output=-1, ignore_start=None):
+        dir of an instance is the dir of its class plus the keys of the instance __dict__,
+        and dir of a class only depends on the class, so dir is only called once per class.
+        Objects with a custom __dir__ (e.g. modules) are not cached.
+        The cache is reset by clear_history.
+        """
+        obj_type = type(obj)
+        if obj_type.__dir__ is object.__dir__:
+            if obj_type not in self.dir_cache:
+                # type.__dir__, not dir: a metaclass __dir__ changes dir(obj_type) but not dir(obj)
+                self.dir_cache[obj_type] = sorted(type.__dir__(obj_type))
+            instance_dict = getattr(obj, '__dict__', None)
+            if isinstance(instance_dict, dict) and instance_dict:
+                return sorted(set(self.dir_cache[obj_type]).union(instance_dict))
+            return self.dir_cache[obj_type]
+        if obj_type.__dir__ is type.__dir__:
+            if obj not in self.dir_cache:
+                self.dir_cache[obj] = dir(obj)
+            return self.dir_cache[obj]
+        return dir(obj)
+
+    def climb_dir(self, obj, drilldown='__class__', max_output=-1, ignore_start=None,
+                  max_depth=None, max_children=None, max_nodes=None):
         """Print the dir results for obj, recursively explore attributes
             of the attribute specified as drilldown.
 
@@ -42,72 +75,97 @@ class Inspector:
         ignore_start: str
             Filter to ignore attributes that start with a character string.
             Typical values include "_" or "__" to suppress magic methods.
+        max_depth : int
+            Maximum number of drilldown levels below obj (None for no limit).
+        max_children : int
+            Maximum number of drilldown results explored per object (None for no limit).
+        max_nodes : int
+            Maximum number of objects printed by this call (None for no limit).
         Notes
         -------
+        The exploration uses an explicit work stack rather than recursion, so deep object graphs
+        do not hit the recursion limit.  Objects are explored depth first in the order found.
+        Visited objects are kept alive in self.visited_objects so their ids stay unique.
         """
-        # Call dir & store the object name and class name
-        obj_dir = dir(obj)
-        obj_class_name = getattr(obj, '__class__').__name__
-        obj_name = getattr(obj, '__name__', f'*Unnamed instance of {obj_class_name}*')
-
-        # If the object has already been inspected then end recursion.
-        # Otherwise, store the object id in the inspected object list
-        if id(obj) in self.climb_history:
-            return
-        else:
-            self.climb_history[id(obj)] = {'object name': obj_name, 'class name': obj_class_name}
-
-        # Display the stack statement that resulted in this function call,
-        # the object's name (if present), and the name of its class
+        # Display the stack statement that resulted in this function call
         my_call = my_calling_statement()
-        my_args = function_arguments(my_call)
-        print(f"\n{'*'*80}")
-        print(f'Directory climb called by: {my_call}')
-        print(f"The class name of this object is: {obj_class_name}")
-        print(f"The name of this object is: {obj_name}")
-        print(f"The object id is: {id(obj)}")
-        print(f"{'-'*80}")
-
-        # Filter out unwanted variables that start with an unwanted string pattern
-        if ignore_start:
-            obj_dir = [i for i in obj_dir if not i.startswith(ignore_start)]
-
-        # Display dir attribute names and the attributes values where possible.
-        for item in obj_dir:
-            if item == "__abstractmethods__":
-                print(f"{item:20s} = ** Not evaluated, calls to __abstractmethods__ can result in exceptions **")
-            else:
-                attr = str(getattr(obj, item))
-                if 0 < max_output < len(attr):
-                    attr = get_max_char(attr, max_output)
-                print(f"{item:20s} = {attr}")
-        print(f"{'-' * 80}")
-
-        # Evaluate the object attribute specified by the drilldown parameter.
-        # getattr(obj, drilldown) results vary based on attribute of interest.
-        # This inspector is designed to handle getattr results that are None, single item, a list, or tuple.
-
-        # End recursion if there is no drilldown parameter
-        if drilldown is None:
-            return
-
-        # Find the drilldown attribute
-        matches = getattr(obj, drilldown, None)
-
-        # If the attribute does not exist, then return and end recursion.
-        if matches is None:
-            return
-
-        # Pack results attribute results into a 1-d list
-        if type(matches) is tuple:
-            matches = [*matches]
-        if type(matches) is not list:
-            matches = [matches]
-        # print(f"Now inspecting: {matches}")
 
-        # Evaluate each attribute in the 1-d list
-        for match in matches:
-            self.climb_dir(match, drilldown, max_output=max_output, ignore_start=ignore_start)
+        stack = [(obj, 0, None)]  # (object, depth, description of how it was found)
+        n_nodes = 0
+        while stack:
+            if max_nodes is not None and n_nodes >= max_nodes:
+                print(f"\n** Stopped after {max_nodes} objects (max_nodes), {len(stack)} not explored **")
+                return
+            obj, depth, found_by = stack.pop()
+
+            # Store the object name and class name
+            obj_class_name = getattr(obj, '__class__').__name__
+            obj_name = getattr(obj, '__name__', f'*Unnamed instance of {obj_class_name}*')
+
+            # If the object has already been inspected then skip it.
+            # Otherwise, store the object id in the inspected object list
+            if id(obj) in self.climb_history:
+                continue
+            self.climb_history[id(obj)] = {'object name': obj_name, 'class name': obj_class_name}
+            self.visited_objects[id(obj)] = obj
+            n_nodes += 1
+
+            # Display the object's name (if present), and the name of its class
+            lines = [f"\n{'*'*80}",
+                     f'Directory climb called by: {found_by or my_call}',
+                     f"The class name of this object is: {obj_class_name}",
+                     f"The name of this object is: {obj_name}",
+                     f"The object id is: {id(obj)}",
+                     f"{'-'*80}"]
+
+            # Filter out unwanted variables that start with an unwanted string pattern
+            obj_dir = self.cached_dir(obj)
+            if ignore_start:
+                obj_dir = [i for i in obj_dir if not i.startswith(ignore_start)]
+
+            # Display dir attribute names and the attributes values where possible.
+            for item in obj_dir:
+                if item == "__abstractmethods__":
+                    lines.append(f"{item:20s} = ** Not evaluated, "
+                                 f"calls to __abstractmethods__ can result in exceptions **")
+                    continue
+                try:
+                    value = getattr(obj, item)
+                except Exception as e:
+                    lines.append(f"{item:20s} = ** getattr raised {type(e).__name__}: {e} **")
+                    continue
+                if max_output > 0:
+                    attr = bounded_repr(value, max_output, output_mode='!s')  # never builds the full string
+                else:
+                    attr = str(value)
+                lines.append(f"{item:20s} = {attr}")
+            lines.append(f"{'-' * 80}")
+            print('\n'.join(lines))
+
+            # Evaluate the object attribute specified by the drilldown parameter.
+            # getattr(obj, drilldown) results vary based on attribute of interest.
+            # This inspector is designed to handle getattr results that are None, single item, a list, or tuple.
+
+            # Don't explore further if there is no drilldown parameter or the depth limit is reached
+            if drilldown is None or (max_depth is not None and depth >= max_depth):
+                continue
+
+            # Find the drilldown attribute, skip the object if it does not exist.
+            matches = getattr(obj, drilldown, None)
+            if matches is None:
+                continue
+
+            # Pack results attribute results into a 1-d list
+            if type(matches) is tuple:
+                matches = [*matches]
+            if type(matches) is not list:
+                matches = [matches]
+            if max_children is not None:
+                matches = matches[:max_children]
+
+            # Push in reverse so that the matches are explored in order
+            found_by = f'{drilldown} of {obj_name}'
+            stack.extend((match, depth + 1, found_by) for match in reversed(matches))
 
     def climb_bases(self, obj):
         """Climb the __bases__ special function to inspect inheritance structure.
@@ -118,41 +176,89 @@ class Inspector:
             obj to explore recursively to inspect its __bases__ variable
         Notes
         -------
+        Bases are found with a ClassHierarchy (see class_hierarchy), walking it with an explicit stack.
+        Each base relationship met is stored in self.children in depth first order, as before.
         """
-        mcs = my_calling_statement()  # Inspect Stack to find the calling statement and its arguments
-        my_obj_name = function_arguments(mcs)
-        # print(mcs, my_obj_name)
+        my_obj_name = calling_arguments()  # Inspect the calling statement to find its arguments
 
         obj_class_name = getattr(obj, '__class__').__name__
         obj_name = getattr(obj, '__name__', f'*Unnamed instance of {obj_class_name}*')
 
-        # print(f"class name: {obj_class_name}")
-        # print(f"object name: {obj_name}")
-
-        # print(dir(obj))
-        # print(obj.__dict__)
-        my_bases = getattr(obj, '__bases__', None)
-        if my_bases is None:
+        if isinstance(obj, type):
+            hierarchy = ClassHierarchy.of(obj)
+            my_bases = hierarchy.bases(obj)
+        else:
             # You have an instance of an object, search its class type next
-            my_bases = (obj.__class__,)
+            hierarchy = ClassHierarchy.of(type(obj))
+            my_bases = [obj.__class__]
             obj_name = f"Instance {my_obj_name}"
 
-        # print(f"my bases = {my_bases}")
-        # Save the parent, child relationship in a dictionary, save entry order
-        my_dict = {}
-        my_dict[obj_name] = [i.__name__ for i in my_bases]
-        self.children[self.entry_id] = my_dict
-        self.entry_id += 1
+        stack = [(obj, obj_name, obj_class_name, my_bases)]
+        while stack:
+            obj, obj_name, obj_class_name, my_bases = stack.pop()
 
-        # Save the current object into a dictionary or exit if it has been examined before
-        if id(obj) in self.climb_history:
-            return
-        else:
+            # Save the parent, child relationship in a dictionary, save entry order
+            self.children[self.entry_id] = {obj_name: [i.__name__ for i in my_bases]}
+            self.entry_id += 1
+
+            # Save the current object into a dictionary or skip it if it has been examined before
+            if id(obj) in self.climb_history:
+                continue
             self.climb_history[id(obj)] = \
                 {'object name': obj_name, 'class name': obj_class_name, '__dict__': obj.__dict__}
 
-        for i in my_bases:
-            self.climb_bases(i)
+            # Push in reverse so that the bases are explored in order
+            stack.extend((i, i.__name__, type(i).__name__, hierarchy.bases(i)) for i in reversed(my_bases))
+
+    def class_hierarchy(self, *roots, submodules=True):
+        """Build an index of the inheritance DAG of classes, modules, or packages.
+        See ClassHierarchy, which answers ancestor, descendant, and MRO queries and exports to DOT/JSON."""
+        if len(roots) == 1:
+            return ClassHierarchy.of(roots[0], submodules=submodules)
+        return ClassHierarchy(*roots, submodules=submodules)
+
+    def climb_memory(self, obj, top_n=20, max_nodes=None, print_=True, json_file=None):
+        """Walk the object graph from obj and find which objects and attributes retain the most memory.
+
+        Parameters
+        ----------
+        obj : object
+            Root of the object graph
+        top_n : int
+            Number of entries in each table of the report
+        max_nodes : int
+            Stop walking after this many objects (None for no limit)
+        print_ : bool
+            True to print the report
+        json_file : str
+            Optional file name to save the report as JSON
+        Returns
+        -------
+        report : dict
+            'n_objects', 'total_size' (bytes), and the top_n entries of:
+            'top_retainers' : objects with the largest retained size
+                              {'path', 'type', 'shallow', 'retained'}
+            'by_type'       : {'type', 'count', 'shallow'} totals per type
+            'by_path'       : {'path', 'count', 'shallow'} totals per attribute path,
+                              with container indices and keys generalized to [*]
+        Notes
+        -------
+        Shallow size is sys.getsizeof, plus the instance __dict__ for objects that have one.
+        numpy arrays report their own data buffer in getsizeof, views are followed to their base.
+        The retained size of an object is its shallow size plus the shallow size of every object
+        only reachable from the root through it (its subtree in the dominator tree of the graph).
+        Modules, classes, functions, and code objects are shared program structure,
+        so they are neither counted nor explored.
+        The walk is iterative and each object is visited once, so cycles are handled.
+        """
+        graph = MemoryGraph(obj, max_nodes=max_nodes)
+        report = graph.report(top_n)
+        if print_:
+            print_memory_report(report)
+        if json_file:
+            with open(json_file, 'w') as f:
+                json.dump(report, f, indent=2)
+        return report
 
     def test_climbs(self):
         """Test the climbDir function"""
@@ -174,6 +280,406 @@ class Inspector:
         self.climb_bases(J())
 
 
+class ClassHierarchy:
+    """Index of the inheritance DAG of the classes found in classes, modules, or packages.
+
+    The index is built once, after which:
+        mro, ancestors, and is_subclass are O(1) lookups (ancestors is returned in MRO order),
+        descendants is O(number of descendants) and cached,
+        depth is the length of the longest chain of bases up to object.
+    Classes are only referenced weakly.  If any indexed class is garbage collected the index
+    is marked stale, and ClassHierarchy.of rebuilds it on the next request.
+
+    Example
+    -------
+    hierarchy = ClassHierarchy.of(numpy)          # numpy and its imported submodules
+    hierarchy.descendants(numpy.generic)
+    open('numpy.dot', 'w').write(hierarchy.to_dot())
+    """
+    cache = weakref.WeakKeyDictionary()  # root (class or module) -> {submodules: ClassHierarchy}
+
+    def __init__(self, *roots, submodules=True):
+        """
+        Parameters
+        ----------
+        *roots : class | module
+            Classes to index (with all of their bases), or modules whose classes are indexed.
+        submodules : bool
+            For a package, also index its submodules that are already imported.
+            Submodules are not imported, so indexing has no side effects.
+        """
+        self.valid = True
+        self._refs = {}         # id -> weakref to the class
+        self._bases = {}        # id -> tuple of base ids
+        self._subclasses = collections.defaultdict(list)  # id -> ids of direct subclasses in the index
+        self._mro = {}          # id -> tuple of ids in MRO order, excluding the class
+        self._ancestors = {}    # id -> frozenset of ancestor ids
+        self._descendants = {}  # id -> frozenset of descendant ids, filled on demand
+        self._depth = {}
+        for root in roots:
+            self.add(root, submodules=submodules)
+
+    @classmethod
+    def of(cls, root, submodules=True):
+        """Cached ClassHierarchy of a class, module, or package, cached separately for each submodules flag."""
+        hierarchies = cls.cache.setdefault(root, {})
+        hierarchy = hierarchies.get(submodules)
+        if hierarchy is None or not hierarchy.valid:
+            hierarchy = hierarchies[submodules] = cls(root, submodules=submodules)
+        return hierarchy
+
+    def _invalidate(self, ref):
+        self.valid = False
+
+    def __len__(self):
+        return len(self._refs)
+
+    def __contains__(self, klass):
+        return id(klass) in self._refs and self._refs[id(klass)]() is klass
+
+    def add(self, root, submodules=True):
+        """Add a class (and its bases), or the classes of a module (and its imported submodules)."""
+        if isinstance(root, type):
+            self._add_classes([root])
+            return
+        modules = [root]
+        if submodules and hasattr(root, '__path__'):
+            prefix = root.__name__ + '.'
+            modules += [m for name, m in list(sys.modules.items()) if name.startswith(prefix) and m is not None]
+        for module in modules:
+            self._add_classes([value for value in list(vars(module).values()) if isinstance(value, type)])
+
+    def _add_classes(self, classes):
+        """Index classes and all of their bases, bases before subclasses."""
+        stack = [(klass, False) for klass in classes]
+        while stack:
+            klass, bases_done = stack.pop()
+            key = id(klass)
+            if key in self._refs:
+                continue
+            if not bases_done:
+                stack.append((klass, True))
+                stack.extend((base, False) for base in klass.__bases__ if id(base) not in self._refs)
+                continue
+            self._refs[key] = weakref.ref(klass, self._invalidate)
+            self._bases[key] = tuple(id(base) for base in klass.__bases__)
+            for base in self._bases[key]:
+                self._subclasses[base].append(key)
+            self._mro[key] = tuple(id(c) for c in klass.__mro__[1:])
+            self._ancestors[key] = frozenset(self._mro[key])
+            self._depth[key] = 1 + max((self._depth[base] for base in self._bases[key]), default=-1)
+            self._descendants.clear()
+
+    def _class(self, key):
+        klass = self._refs[key]()
+        if klass is None:
+            raise ReferenceError('An indexed class was garbage collected, rebuild the ClassHierarchy')
+        return klass
+
+    def classes(self):
+        """All indexed classes."""
+        return [self._class(key) for key in self._refs]
+
+    def bases(self, klass):
+        """Direct bases of klass."""
+        return [self._class(key) for key in self._bases[id(klass)]]
+
+    def subclasses(self, klass):
+        """Direct subclasses of klass that are in the index."""
+        return [self._class(key) for key in self._subclasses[id(klass)]]
+
+    def mro(self, klass):
+        """Method resolution order of klass, including klass."""
+        return klass.__mro__ if id(klass) in self._mro else None
+
+    def ancestors(self, klass):
+        """All bases of klass (direct and indirect) in MRO order."""
+        return [self._class(key) for key in self._mro[id(klass)]]
+
+    def is_subclass(self, klass, base):
+        """True if base is klass or one of its ancestors."""
+        return klass is base or id(base) in self._ancestors[id(klass)]
+
+    def descendants(self, klass):
+        """All subclasses of klass (direct and indirect) in the index."""
+        key = id(klass)
+        if key not in self._descendants:
+            found = set()
+            stack = [key]
+            while stack:
+                for sub in self._subclasses[stack.pop()]:
+                    if sub not in found:
+                        found.add(sub)
+                        stack.append(sub)
+            self._descendants[key] = frozenset(found)
+        return {self._class(sub) for sub in self._descendants[key]}
+
+    def depth(self, klass):
+        """Length of the longest chain of bases from klass up to object (object is 0)."""
+        return self._depth[id(klass)]
+
+    @staticmethod
+    def qualified_name(klass):
+        return f'{klass.__module__}.{klass.__qualname__}'
+
+    def to_json(self):
+        """Index as a JSON string: {"nodes": [{"id", "module", "name", "depth"}], "edges": [[base id, subclass id]]}.
+        Node ids are the qualified class names."""
+        nodes = []
+        edges = []
+        for key in self._refs:
+            klass = self._class(key)
+            name = self.qualified_name(klass)
+            nodes.append({'id': name, 'module': klass.__module__, 'name': klass.__qualname__,
+                          'depth': self._depth[key]})
+            edges.extend([self.qualified_name(self._class(base)), name] for base in self._bases[key])
+        return json.dumps({'nodes': nodes, 'edges': edges})
+
+    def to_dot(self, name='classes'):
+        """Index in Graphviz DOT format, with an edge from each base to its subclasses."""
+        lines = [f'digraph "{name}" {{', '    rankdir=BT;']
+        for key in self._refs:
+            klass = self._class(key)
+            lines.append(f'    "{self.qualified_name(klass)}" [label="{klass.__qualname__}"];')
+        for key, bases in self._bases.items():
+            sub = self.qualified_name(self._class(key))
+            lines.extend(f'    "{sub}" -> "{self.qualified_name(self._class(base))}";' for base in bases)
+        lines.append('}')
+        return '\n'.join(lines)
+
+
+# Types that are shared program structure, skipped by the memory profiler
+SKIPPED_TYPES = (types.ModuleType, type, types.FunctionType, types.BuiltinFunctionType,
+                 types.MethodType, types.CodeType, types.FrameType)
+
+
+def memory_children(obj):
+    """Yield (label, pattern label, child) for the objects referenced by obj, as seen by the memory profiler.
+
+    label is the exact path step (e.g. ".data", "[3]"), or for dicts a (template, key) pair rendered
+    only when a path is displayed (see step_text), as "['key']" for the value and "<key 'key'>" for the key.
+    pattern label generalizes container indices and values to "[*]" and dict keys to "<key *>".
+    """
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            yield ('<key {}>', key), '<key *>', key
+            yield ('[{}]', key), '[*]', value
+    elif isinstance(obj, (list, tuple, collections.deque)):
+        for i, value in enumerate(obj):
+            yield f'[{i}]', '[*]', value
+    elif isinstance(obj, (set, frozenset)):
+        for value in obj:
+            yield '{*}', '{*}', value
+    else:
+        instance_dict = getattr(obj, '__dict__', None)
+        if isinstance(instance_dict, dict):
+            for name, value in instance_dict.items():
+                yield f'.{name}', f'.{name}', value
+        for cls in type(obj).__mro__:
+            slots = cls.__dict__.get('__slots__', ())
+            for name in (slots,) if isinstance(slots, str) else slots:
+                if name not in ('__dict__', '__weakref__') and hasattr(obj, name):
+                    yield f'.{name}', f'.{name}', getattr(obj, name)
+        base = getattr(obj, 'base', None) if hasattr(obj, 'nbytes') else None  # numpy views
+        if base is not None:
+            yield '.base', '.base', base
+
+
+def step_text(label):
+    """Text of a path step yielded by memory_children."""
+    if isinstance(label, tuple):
+        template, key = label
+        return template.format(bounded_repr(key, 40))
+    return label
+
+
+def shallow_size(obj):
+    """sys.getsizeof(obj) plus the size of its instance __dict__."""
+    size = sys.getsizeof(obj, 0)
+    instance_dict = getattr(obj, '__dict__', None)
+    if isinstance(instance_dict, dict) and not isinstance(obj, SKIPPED_TYPES):
+        size += sys.getsizeof(instance_dict, 0)
+    return size
+
+
+class MemoryGraph:
+    """Object graph walked from a root for memory profiling, see Inspector.climb_memory.
+
+    Nodes are numbered in breadth first order from the root.  Per node, parallel lists store the shallow size,
+    type name, parent and path step of a shortest path from the root, attribute path pattern, and predecessors.
+    Retained sizes are computed from the dominator tree with the iterative algorithm of
+    Cooper, Harvey, and Kennedy, "A Simple, Fast Dominance Algorithm".
+    """
+    def __init__(self, root, max_nodes=None):
+        self.objects = []      # keeps the walked objects alive so their ids stay unique
+        self.sizes = []
+        self.type_names = []
+        self.parents = []      # (parent node, path step label) of a shortest path to each node
+        self.patterns = []     # attribute path pattern id of each node
+        self.predecessors = []
+        self.postorder = []    # nodes in DFS postorder
+        self.truncated = False
+        self._pattern_ids = {}     # (parent pattern id, pattern label) -> pattern id
+        self._pattern_keys = []    # pattern id -> (parent pattern id, pattern label)
+        self._walk(root, max_nodes)
+        self.retained = self._retained_sizes()
+
+    def _add_node(self, obj, parent, label, pattern):
+        self.objects.append(obj)
+        self.sizes.append(shallow_size(obj))
+        self.type_names.append(type(obj).__name__)
+        self.parents.append((parent, label))
+        self.patterns.append(pattern)
+        self.predecessors.append([] if parent is None else [parent])
+        return len(self.objects) - 1
+
+    def _pattern_id(self, parent_pattern, pattern_label):
+        key = (parent_pattern, pattern_label)
+        if key not in self._pattern_ids:
+            self._pattern_ids[key] = len(self._pattern_keys)
+            self._pattern_keys.append(key)
+        return self._pattern_ids[key]
+
+    def _walk(self, root, max_nodes):
+        """Breadth first walk that numbers the nodes, so the parent and path pattern of each node are
+        those of a shortest path from the root, then a depth first pass over the recorded edges
+        for the postorder used by the dominator algorithm."""
+        index = {id(root): 0}
+        self._add_node(root, None, 'root', self._pattern_id(None, 'root'))
+        successors = [[]]
+        node = 0
+        while node < len(self.objects):
+            for label, pattern_label, child in memory_children(self.objects[node]):
+                if isinstance(child, SKIPPED_TYPES):
+                    continue
+                child_index = index.get(id(child))
+                if child_index is not None:
+                    self.predecessors[child_index].append(node)
+                elif max_nodes is not None and len(self.objects) >= max_nodes:
+                    self.truncated = True
+                    continue
+                else:
+                    child_index = index[id(child)] = self._add_node(
+                        child, node, label, self._pattern_id(self.patterns[node], pattern_label))
+                    successors.append([])
+                successors[node].append(child_index)
+            node += 1
+
+        visited = [False] * len(self.objects)
+        visited[0] = True
+        stack = [(0, iter(successors[0]))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if not visited[child]:
+                    visited[child] = True
+                    stack.append((child, iter(successors[child])))
+                    break
+            else:
+                stack.pop()
+                self.postorder.append(node)
+
+    def _retained_sizes(self):
+        """Retained size of every node, from the dominator tree of the graph."""
+        n = len(self.objects)
+        order = [0] * n  # postorder number of each node
+        for number, node in enumerate(self.postorder):
+            order[node] = number
+
+        idom = [None] * n
+        idom[0] = 0
+        reverse_postorder = self.postorder[-2::-1]  # without the root, which is last in postorder
+        changed = True
+        while changed:
+            changed = False
+            for node in reverse_postorder:
+                new_idom = None
+                for pred in self.predecessors[node]:
+                    if idom[pred] is None:
+                        continue
+                    if new_idom is None:
+                        new_idom = pred
+                        continue
+                    # intersect: walk both fingers up the dominator tree to their common ancestor
+                    a, b = pred, new_idom
+                    while a != b:
+                        while order[a] < order[b]:
+                            a = idom[a]
+                        while order[b] < order[a]:
+                            b = idom[b]
+                    new_idom = a
+                if idom[node] != new_idom:
+                    idom[node] = new_idom
+                    changed = True
+
+        # a node's dominator tree descendants come before it in postorder
+        retained = list(self.sizes)
+        for node in self.postorder[:-1]:
+            retained[idom[node]] += retained[node]
+        return retained
+
+    def path(self, node):
+        """Exact path from the root to node, e.g. root.cache['key'][3]"""
+        steps = []
+        while node is not None:
+            node, label = self.parents[node]
+            steps.append(step_text(label))
+        return ''.join(reversed(steps))
+
+    def pattern(self, pattern_id):
+        """Attribute path pattern text, e.g. root.cache[*][*]"""
+        steps = []
+        while pattern_id is not None:
+            pattern_id, label = self._pattern_keys[pattern_id]
+            steps.append(label)
+        return ''.join(reversed(steps))
+
+    def report(self, top_n=20):
+        """Machine readable summary, see Inspector.climb_memory."""
+        by_type = collections.defaultdict(lambda: [0, 0])
+        by_pattern = collections.defaultdict(lambda: [0, 0])
+        for node, size in enumerate(self.sizes):
+            totals = by_type[self.type_names[node]]
+            totals[0] += 1
+            totals[1] += size
+            totals = by_pattern[self.patterns[node]]
+            totals[0] += 1
+            totals[1] += size
+
+        top_nodes = heapq.nlargest(top_n, range(len(self.sizes)), key=self.retained.__getitem__)
+        top_types = heapq.nlargest(top_n, by_type.items(), key=lambda item: item[1][1])
+        top_patterns = heapq.nlargest(top_n, by_pattern.items(), key=lambda item: item[1][1])
+        return {
+            'n_objects': len(self.sizes),
+            'total_size': self.retained[0] if self.sizes else 0,
+            'truncated': self.truncated,
+            'top_retainers': [{'path': self.path(node), 'type': self.type_names[node],
+                               'shallow': self.sizes[node], 'retained': self.retained[node]}
+                              for node in top_nodes],
+            'by_type': [{'type': name, 'count': count, 'shallow': size}
+                        for name, (count, size) in top_types],
+            'by_path': [{'path': self.pattern(pattern_id), 'count': count, 'shallow': size}
+                        for pattern_id, (count, size) in top_patterns],
+        }
+
+
+def print_memory_report(report):
+    """Print the report returned by Inspector.climb_memory."""
+    truncated = ' (walk stopped at max_nodes)' if report['truncated'] else ''
+    print(f"\n{'*'*80}")
+    print(f"{report['n_objects']} objects, {report['total_size']:,} bytes retained by the root{truncated}")
+    print(f"{'-'*80}\nTop retainers\n{'retained':>14s} {'shallow':>14s}  type / path")
+    for entry in report['top_retainers']:
+        print(f"{entry['retained']:14,d} {entry['shallow']:14,d}  {entry['type']:20s} {entry['path']}")
+    print(f"{'-'*80}\nBy type\n{'shallow':>14s} {'count':>10s}  type")
+    for entry in report['by_type']:
+        print(f"{entry['shallow']:14,d} {entry['count']:10,d}  {entry['type']}")
+    print(f"{'-'*80}\nBy attribute path\n{'shallow':>14s} {'count':>10s}  path")
+    for entry in report['by_path']:
+        print(f"{entry['shallow']:14,d} {entry['count']:10,d}  {entry['path']}")
+    print(f"{'-'*80}")
+
+
 """Simple classes to test introspection functions"""
 class A: pass
 class B(A): pass
@@ -0,0 +1,362 @@
+"""
+Production timing instrumentation: durations are recorded into fixed size log-linear histograms
+(the bucket layout of HDR histograms) and percentile summaries are logged periodically through
+SingletonLogger, instead of logging every duration.
+
+Example
+-------
+    @timed
+    def handle(request):
+        ...
+
+    with timed('db.query'):
+        ...
+
+    start_reporting(interval=60)    # one 'timing' log line per name and minute
+
+Created by: Tony Held tony.held@gmail.com
+Created on: 2021-03-10
+Copyright © 2021 Tony Held.  All rights reserved.
+"""
+
+import atexit
+import functools
+import logging
+import threading
+import time
+import weakref
+
+from tony_util.log_util import SingletonLogger
+
+# linear sub-buckets per power of 2 are 2 ** (SUB_BUCKET_BITS - 1), the bucket width is < 1/32 of its value
+SUB_BUCKET_BITS = 6
+HALF_SUB_BUCKETS = 1 << (SUB_BUCKET_BITS - 1)
+# durations are in ns, longer than 2 ** 40 ns (~18 minutes) are counted in the last bucket
+MAX_BITS = 40
+MAX_VALUE = (1 << MAX_BITS) - 1
+
+
+def bucket_index(value):
+    """Histogram bucket of a non negative integer value: exact below 2 ** SUB_BUCKET_BITS,
+    then HALF_SUB_BUCKETS linear buckets per power of 2."""
+    if value > MAX_VALUE:
+        value = MAX_VALUE
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    if shift <= 0:
+        return value
+    return shift * HALF_SUB_BUCKETS + (value >> shift)
+
+
+def bucket_bounds(index):
+    """(lowest, highest) value counted in a bucket."""
+    if index < (1 << SUB_BUCKET_BITS):
+        return index, index
+    shift = index // HALF_SUB_BUCKETS - 1
+    lowest = (index - shift * HALF_SUB_BUCKETS) << shift
+    return lowest, lowest + (1 << shift) - 1
+
+
+N_BUCKETS = bucket_index(MAX_VALUE) + 1
+
+
+class Histogram:
+    """Log-linear histogram of durations (ns) with a fixed number of buckets.
+
+    A histogram is only written by one thread (see TimerStats), so recording needs no lock.
+    """
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * N_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        """Count one duration (ns)."""
+        self.counts[bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add the counts of other to this histogram."""
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def subtract(self, other):
+        """Histogram of the values recorded since other, an earlier copy of this histogram.
+        The max is the highest value of the highest non-empty bucket of the difference
+        (at most self.max), so a spike only shows in the interval that recorded it."""
+        difference = Histogram()
+        difference.counts = [a - b for a, b in zip(self.counts, other.counts)]
+        difference.count, difference.total = self.count - other.count, self.total - other.total
+        for index in range(N_BUCKETS - 1, -1, -1):
+            if difference.counts[index]:
+                difference.max = min(bucket_bounds(index)[1], self.max)
+                break
+        return difference
+
+    def percentile(self, q):
+        """Value at percentile q (0-100), the highest value of its bucket so it is never underestimated."""
+        if not self.count:
+            return 0
+        rank = max(1, round(q / 100 * self.count))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bucket_bounds(index)[1], self.max)
+        return self.max
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """Dict of count, mean, the percentiles (keys 'p50' ...), and max, in ns."""
+        summary = {'count': self.count, 'mean': self.total / self.count if self.count else 0}
+        summary.update({f'p{q:g}': self.percentile(q) for q in percentiles})
+        summary['max'] = self.max
+        return summary
+
+
+class TimerStats:
+    """Durations recorded under one name, with one Histogram per thread that records.
+
+    Each thread only writes its own histogram, so no lock is taken per record.  The lock is only
+    used when a thread records its first duration and when the histograms are merged.
+    The histograms of threads that have ended are then added to one retired histogram and dropped,
+    so memory is bounded by the number of live threads.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.histograms = []    # (weakref to the recording thread, its Histogram)
+        self.retired = Histogram()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.reported = Histogram()
+
+    def _retire_ended_threads(self):
+        """Merge the histograms of ended threads into self.retired.  Caller must hold self.lock."""
+        live = []
+        for thread_ref, histogram in self.histograms:
+            thread = thread_ref()
+            if thread is None or not thread.is_alive():
+                self.retired.merge(histogram)
+            else:
+                live.append((thread_ref, histogram))
+        self.histograms = live
+
+    def thread_histogram(self):
+        """Histogram of the calling thread, created on the thread's first call."""
+        histogram = Histogram()
+        with self.lock:
+            self._retire_ended_threads()
+            self.histograms.append((weakref.ref(threading.current_thread()), histogram))
+        self.local.histogram = histogram
+        return histogram
+
+    def record(self, value, sub_bucket_bits=SUB_BUCKET_BITS, half_sub_buckets=HALF_SUB_BUCKETS,
+               max_value=MAX_VALUE, last_bucket=N_BUCKETS - 1):
+        """Record a duration (ns).  Histogram.record with bucket_index inlined, this is the hot path."""
+        try:
+            histogram = self.local.histogram
+        except AttributeError:
+            histogram = self.thread_histogram()
+        shift = value.bit_length() - sub_bucket_bits
+        if shift <= 0:
+            histogram.counts[value] += 1
+        elif value <= max_value:
+            histogram.counts[shift * half_sub_buckets + (value >> shift)] += 1
+        else:
+            histogram.counts[last_bucket] += 1
+        histogram.count += 1
+        histogram.total += value
+        if value > histogram.max:
+            histogram.max = value
+
+    def snapshot(self):
+        """Merged histogram of all threads since the start.  Histograms of other threads are read
+        while they may be recording, so the latest records can be missing (never double counted)."""
+        merged = Histogram()
+        with self.lock:
+            self._retire_ended_threads()
+            merged.merge(self.retired)
+            histograms = [histogram for _, histogram in self.histograms]
+        for histogram in histograms:
+            merged.merge(histogram)
+        return merged
+
+    def interval(self):
+        """Histogram of the durations recorded since the previous call."""
+        snapshot = self.snapshot()
+        interval = snapshot.subtract(self.reported)
+        self.reported = snapshot
+        return interval
+
+
+# name -> TimerStats
+timers = {}
+timers_lock = threading.Lock()
+
+
+def get_timer(name):
+    """TimerStats of name, created on first use."""
+    stats = timers.get(name)
+    if stats is None:
+        with timers_lock:
+            stats = timers.setdefault(name, TimerStats(name))
+    return stats
+
+
+class Timed:
+    """Context manager and decorator recording durations under a name, see timed."""
+    __slots__ = ('name', 'stats', 't0')
+
+    def __init__(self, name=None):
+        self.name = name
+        self.stats = get_timer(name) if name is not None else None
+
+    def __enter__(self):
+        if self.stats is None:
+            raise ValueError('timed needs a name when used as a context manager')
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats.record(time.perf_counter_ns() - self.t0)
+
+    def __call__(self, func):
+        stats = self.stats or get_timer(f'{func.__module__}.{func.__qualname__}')
+        record = stats.record
+        clock = time.perf_counter_ns
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            t0 = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(clock() - t0)
+        return wrapper
+
+
+def timed(name=None):
+    """Record durations in the histogram of name.
+
+    Usage
+    -----
+        @timed                      # name is module.qualname of the function
+        @timed('handler')
+        with timed('db.query'):     # a new timed object per with statement, don't share one between threads
+
+    Parameters
+    ----------
+    name : str | callable
+        Name of the timer, or the decorated function when used as @timed
+
+    Returns
+    -------
+    Timed context manager / decorator, or the wrapped function for @timed
+    """
+    if callable(name):
+        return Timed()(name)
+    return Timed(name)
+
+
+def report(logger=None, level=logging.INFO, percentiles=(50, 90, 99), interval=True):
+    """Log one summary line per timer with records, e.g.
+        timing db.query count=1200 mean=0.813ms p50=0.702ms p90=1.41ms p99=3.05ms max=12.2ms
+
+    Parameters
+    ----------
+    logger : logging.Logger
+        Destination, SingletonLogger.get_logger('timing') if None
+    level : int
+        Level of the summary records
+    percentiles : iterable of float
+        Percentiles reported
+    interval : bool
+        Summarize the durations since the previous report, otherwise since the start
+
+    Returns
+    -------
+    summaries : dict
+        name -> summary dict (see Histogram.summary), in ns
+    """
+    logger = logger or SingletonLogger.get_logger('timing')
+    summaries = {}
+    for name, stats in list(timers.items()):
+        histogram = stats.interval() if interval else stats.snapshot()
+        if not histogram.count:
+            continue
+        summary = summaries[name] = histogram.summary(percentiles)
+        values = ' '.join(f'{k}={v / 1e6:.3g}ms' for k, v in summary.items() if k != 'count')
+        logger.log(level, 'timing %s count=%d %s', name, summary['count'], values)
+    return summaries
+
+
+class Reporter:
+    """Daemon thread calling report every interval seconds, and once more when stopped."""
+
+    def __init__(self, interval=60.0, **kwargs):
+        self.interval = interval
+        self.kwargs = kwargs
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='timing reporter', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            report(**self.kwargs)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        report(**self.kwargs)
+
+
+reporter = None
+_atexit_registered = False
+
+
+def start_reporting(interval=60.0, **kwargs):
+    """Start logging timing summaries every interval seconds (see report for kwargs).
+    Replaces a reporter started before.  The last summaries are logged at exit."""
+    global reporter, _atexit_registered
+    stop_reporting()
+    if kwargs.get('logger') is None:
+        # create the logger first, so its atexit shutdown runs after stop_reporting
+        kwargs['logger'] = SingletonLogger.get_logger('timing')
+    if not _atexit_registered:
+        atexit.register(stop_reporting)
+        _atexit_registered = True
+    reporter = Reporter(interval, **kwargs).start()
+    return reporter
+
+
+def stop_reporting():
+    """Stop the periodic reports, logging the durations recorded since the last one."""
+    global reporter
+    if reporter is not None:
+        reporter.stop()
+        reporter = None
+
+
+if __name__ == '__main__':
+    import random
+
+    @timed
+    def work():
+        time.sleep(random.expovariate(1000))
+
+    start_reporting(interval=0.5)
+    for _ in range(300):
+        work()
+        with timed('short'):
+            sum(range(1000))
+    stop_reporting()
@@ -25,12 +25,44 @@ CRITICAL    50      A serious error,
                     """
 
 import logging
+import logging.handlers
 import sys
 import os
+import atexit
+import copy
+import threading
 import warnings
 import datetime
+import time
+import gzip
+import shutil
+import json
+import itertools
+import types
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Listener, Client
+from json.encoder import encode_basestring
+from queue import Queue, Full, Empty
 import numpy as np
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Policies available to QueueOverflowHandler when its bounded queue is full
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'drop')
+
+# Compression methods for rotated log segments and the file extension they add
+COMPRESSION_EXTENSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
 
 class FilterOutWarningsErrors(logging.Filter):
     """Filter out logging.WARNING or greater messages.
@@ -44,6 +76,965 @@ class FilterOutWarningsErrors(logging.Filter):
             return True
 
 
+class TemplateFilter(logging.Filter):
+    """Base class of filters that keep state per (logger name, level, message template).
+
+    State is kept in an LRU ordered dictionary limited to max_templates entries,
+    so each record costs O(1) and memory is bounded.  The summary of what an evicted entry
+    suppressed (see pending_summary) is logged when it is evicted, and flush() logs the summaries
+    of all entries, which SingletonLogger.shutdown does at exit.
+    These filters are meant to be added to a logger (not a handler) because they
+    report what they suppressed by passing a summary record to the logger.
+    """
+    summary_attr = 'template_filter_summary'  # set on summary records so no filter suppresses them
+
+    def __init__(self, max_templates=1000):
+        super().__init__()
+        self.max_templates = max_templates
+        self.templates = OrderedDict()
+        self._lock = threading.Lock()
+        self._evicted = []  # summaries of evicted entries, logged by emit_evicted
+
+    @staticmethod
+    def key(record):
+        msg = record.msg if isinstance(record.msg, str) else str(record.msg)
+        return record.name, record.levelno, msg
+
+    def lookup(self, key, default):
+        """Return the state of key (most recently used), inserting default if missing.
+        Caller must hold self._lock, and call emit_evicted after releasing it."""
+        state = self.templates.get(key)
+        if state is None:
+            state = self.templates[key] = default
+            if len(self.templates) > self.max_templates:
+                summary = self.pending_summary(self.templates.popitem(last=False)[1])
+                if summary:
+                    self._evicted.append(summary)
+        else:
+            self.templates.move_to_end(key)
+        return state
+
+    def pending_summary(self, state):
+        """Summary arguments (record, msg, *args) of the records suppressed by an entry since its
+        last summary, None if there are none, and reset its count.  Caller must hold self._lock."""
+        return None
+
+    def emit_evicted(self):
+        """Log the summaries of the entries evicted by lookup."""
+        with self._lock:
+            evicted, self._evicted = self._evicted, []
+        for summary in evicted:
+            self.emit_summary(*summary)
+
+    def flush(self, key=None):
+        """Log the pending summary of the entry key, or of every entry if None."""
+        with self._lock:
+            if key is None:
+                states = list(self.templates.values())
+            else:
+                states = [self.templates[key]] if key in self.templates else []
+            pending = [summary for summary in map(self.pending_summary, states) if summary]
+        for summary in pending:
+            self.emit_summary(*summary)
+
+    def emit_summary(self, record, msg, *args):
+        """Log msg % args at the level of record, ahead of record, without exception information."""
+        summary = logging.makeLogRecord(dict(record.__dict__, msg=msg, args=args, exc_info=None,
+                                             exc_text=None, stack_info=None))
+        setattr(summary, self.summary_attr, True)
+        logging.getLogger(record.name).handle(summary)
+
+
+class RateLimitFilter(TemplateFilter):
+    """Token bucket rate limiter per (logger name, level, message template).
+
+    Each template may log burst records at once and then rate records per second.
+    When a template is allowed to log again after records were dropped,
+    a summary record with the number of suppressed records is logged first.
+    """
+    def __init__(self, rate=1.0, burst=10, max_templates=1000):
+        super().__init__(max_templates)
+        self.rate = rate
+        self.burst = burst
+
+    def filter(self, record):
+        if getattr(record, self.summary_attr, False):
+            return True
+        now = record.created
+        pending = None
+        with self._lock:
+            # state is [tokens, time of last refill, suppressed records, last suppressed record]
+            state = self.lookup(self.key(record), [self.burst, now, 0, None])
+            state[0] = min(self.burst, state[0] + (now - state[1]) * self.rate)
+            state[1] = now
+            allowed = state[0] >= 1
+            if allowed:
+                state[0] -= 1
+                pending = self.pending_summary(state)
+            else:
+                state[2] += 1
+                state[3] = record
+        if self._evicted:
+            self.emit_evicted()
+        if pending:
+            self.emit_summary(*pending)
+        return allowed
+
+    def pending_summary(self, state):
+        suppressed, state[2] = state[2], 0
+        record, state[3] = state[3], None
+        return (record, '%d similar messages suppressed by rate limit', suppressed) if suppressed else None
+
+
+class DuplicateFilter(TemplateFilter):
+    """Collapse consecutive identical messages of a logger.
+
+    A record with the same level and formatted message as the previous record of its logger is dropped.
+    The number of dropped records is logged as "Last message repeated N times"
+        1) ahead of the next different message of the logger,
+        2) timeout seconds after the first dropped record (later repeats are counted again),
+        3) when flush() is called, which SingletonLogger.shutdown does at exit,
+        4) when the logger's entry is evicted.
+    State is kept per logger name (max_templates loggers).
+    """
+    def __init__(self, max_templates=1000, timeout=60.0):
+        super().__init__(max_templates)
+        self.timeout = timeout
+
+    def filter(self, record):
+        if getattr(record, self.summary_attr, False):
+            return True
+        message = record.getMessage()
+        pending = None
+        with self._lock:
+            # state is [last message, last level, last dropped record, repeats, timeout timer]
+            state = self.lookup(record.name, [None, None, None, 0, None])
+            duplicate = state[0] == message and state[1] == record.levelno
+            if duplicate:
+                state[2] = record
+                state[3] += 1
+                if state[3] == 1 and self.timeout:
+                    state[4] = threading.Timer(self.timeout, self.flush, (record.name,))
+                    state[4].daemon = True
+                    state[4].start()
+            else:
+                pending = self.pending_summary(state)
+                state[0], state[1], state[2] = message, record.levelno, None
+        if self._evicted:
+            self.emit_evicted()
+        if pending:
+            self.emit_summary(*pending)
+        return not duplicate
+
+    def pending_summary(self, state):
+        if state[4] is not None:
+            state[4].cancel()
+            state[4] = None
+        repeats, state[3] = state[3], 0
+        return (state[2], 'Last message repeated %d times', repeats) if repeats else None
+
+
+def prepare_record(record):
+    """Copy of a record that can be queued or pickled, for QueueHandler.prepare.
+
+    Unlike QueueHandler.prepare, which formats the traceback and stack into msg, only the message
+    is merged into msg: the traceback is rendered to exc_text and stack_info is kept, so the handlers
+    at the other end format them as separate fields (e.g. "exc_info" in JSON lines) as in direct mode.
+    """
+    message = record.getMessage()
+    exc_text = record.exc_text
+    if record.exc_info and not exc_text:
+        exc_text = logging._defaultFormatter.formatException(record.exc_info)
+    record = copy.copy(record)
+    record.message = record.msg = message
+    record.args = None
+    record.exc_info = None
+    record.exc_text = exc_text
+    return record
+
+
+class QueueOverflowHandler(logging.handlers.QueueHandler):
+    """QueueHandler for a bounded queue with a selectable policy when the queue is full.
+
+    Overflow policies:
+        'block'       - caller waits until the listener thread frees a slot (no records lost)
+        'drop_oldest' - discard the oldest queued record to make room for the new one
+        'drop'        - discard the new record
+    Records discarded by either drop policy are counted in self.dropped.
+    """
+    def __init__(self, queue, overflow='block'):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f'overflow must be one of {OVERFLOW_POLICIES}, not {overflow!r}')
+        super().__init__(queue)
+        self.overflow = overflow
+        self.dropped = 0
+        self._drop_lock = threading.Lock()  # only taken when a record is discarded
+
+    def prepare(self, record):
+        return prepare_record(record)
+
+    def _count_drop(self):
+        with self._drop_lock:
+            self.dropped += 1
+
+    def enqueue(self, record):
+        if self.overflow == 'block':
+            self.queue.put(record)
+            return
+
+        try:
+            self.queue.put_nowait(record)
+            return
+        except Full:
+            if self.overflow == 'drop':
+                self._count_drop()
+                return
+
+        # drop_oldest: evict from the head of the queue until the new record fits
+        while True:
+            try:
+                self.queue.get_nowait()
+                self._count_drop()
+            except Empty:
+                pass
+            try:
+                self.queue.put_nowait(record)
+                return
+            except Full:
+                continue
+
+
+class BoundedQueueListener(logging.handlers.QueueListener):
+    """QueueListener that can be stopped when its bounded queue is full.
+    The stock listener uses put_nowait for its stop sentinel, which raises queue.Full
+    if producers have filled the queue, so wait for the listener to free a slot instead."""
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """FileHandler that collects formatted records in memory and writes them in batches.
+
+    The buffer is written to the file when any of the following occur:
+        1) buffer_bytes characters have accumulated
+        2) flush_interval seconds have passed since the last write, checked as records arrive and
+           every flush_interval / 2 seconds by a daemon flusher thread (started with the first record),
+           so records of an idle logger wait at most about 1.5 * flush_interval seconds
+        3) a record at flush_level or greater arrives
+        4) flush() or close() is called, which logging.shutdown does at process exit
+    """
+    def __init__(self, filename, mode='a', encoding=None, delay=False,
+                 buffer_bytes=64 * 1024, flush_interval=1.0, flush_level=logging.WARNING):
+        super().__init__(filename, mode=mode, encoding=encoding, delay=delay)
+        self.buffer_bytes = buffer_bytes
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self._buffer = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+        self._closing = threading.Event()
+        self._flusher = None
+
+    def emit(self, record):
+        # handle() holds self.lock while emit runs, so the buffer needs no extra locking
+        try:
+            msg = self.format(record) + self.terminator
+        except Exception:
+            self.handleError(record)
+            return
+        self._buffer.append(msg)
+        self._buffered += len(msg)
+        if (self._buffered >= self.buffer_bytes
+                or record.levelno >= self.flush_level
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self._write_buffer(record)
+        elif self._flusher is None and self.flush_interval:
+            self._flusher = threading.Thread(target=self._flush_periodically,
+                                             name=f'BufferedFileHandler {self.baseFilename}', daemon=True)
+            self._flusher.start()
+
+    def _flush_periodically(self):
+        """Flusher thread: write the buffer once flush_interval seconds have passed since the last write.
+        The lock is only tried, never waited for: close() may be called with the lock held
+        (logging.shutdown does), and a record holding it will write the buffer anyway."""
+        while not self._closing.wait(self.flush_interval / 2):
+            if not self.lock.acquire(blocking=False):
+                continue
+            try:
+                if self._closing.is_set():
+                    return
+                if self._buffer and time.monotonic() - self._last_flush >= self.flush_interval:
+                    self._write_buffer()
+            finally:
+                self.lock.release()
+
+    def _write_buffer(self, record=None):
+        """Write and clear the buffer.  Caller must hold self.lock."""
+        if self._buffer:
+            try:
+                if self.stream is None:
+                    self.stream = self._open()
+                self.stream.write(''.join(self._buffer))
+                self.stream.flush()
+            except Exception:
+                if record is not None:
+                    self.handleError(record)
+            self._buffer.clear()
+            self._buffered = 0
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        self.acquire()
+        try:
+            self._write_buffer()
+        finally:
+            self.release()
+
+    def close(self):
+        # not joined, the caller may hold the lock; the flusher exits on its next wake up
+        self._closing.set()
+        self.flush()
+        super().close()
+
+
+class RingBufferHandler(logging.Handler):
+    """Keep the last capacity low level records in memory and write them to a target handler
+    only when a record at flush_level or greater arrives, or when dump() is called.
+
+    Records at pass_level or greater are passed to the target immediately.
+    Records below pass_level are stored in a preallocated ring of tuples
+    (created, msecs, relativeCreated, levelno, levelname, name, pathname, filename, module, lineno, funcName,
+    msg, args, exc_text, stack_info, thread, threadName, process, processName, extra= fields or None),
+    and formatted only if they are dumped.  Records with args that are not all immutable scalars
+    (e.g. a list or an object) have their message merged when they are stored, so a dump shows the
+    values at the time of the call.  A traceback is rendered to exc_text when its record is stored,
+    so the ring doesn't keep the frames alive.
+    Memory is bounded by capacity, although the args and extra= values of a stored record are kept alive
+    until the record is overwritten.
+    """
+    # attributes present on every LogRecord (and added by formatting), anything else was passed with extra=
+    base_attributes = frozenset(logging.makeLogRecord({}).__dict__) | {'message', 'asctime'}
+    n_base_attributes = len(logging.makeLogRecord({}).__dict__)
+    # args of these types are stored as they are, their message is the same when it is formatted later
+    immutable_types = frozenset({str, int, float, bool, bytes, type(None)})
+
+    def __init__(self, capacity, target, pass_level=logging.INFO, flush_level=logging.ERROR):
+        super().__init__()
+        self.capacity = capacity
+        self.target = target
+        self.pass_level = pass_level
+        self.flush_level = flush_level
+        self._ring = [None] * capacity
+        self._next = 0  # index of the next slot to write
+        self._size = 0  # number of records in the ring
+
+    def emit(self, record):
+        # handle() holds self.lock while emit runs
+        if record.levelno < self.pass_level:
+            exc_text = record.exc_text
+            if record.exc_info and not exc_text:
+                exc_text = (self.target.formatter or logging._defaultFormatter).formatException(record.exc_info)
+            msg, args = record.msg, record.args
+            if args and not (type(args) is tuple and all(type(arg) in self.immutable_types for arg in args)):
+                msg, args = record.getMessage(), None
+            extras = None
+            if len(record.__dict__) > self.n_base_attributes:
+                extras = {key: value for key, value in record.__dict__.items() if key not in self.base_attributes}
+            self._ring[self._next] = (record.created, record.msecs, record.relativeCreated, record.levelno,
+                                      record.levelname, record.name, record.pathname, record.filename,
+                                      record.module, record.lineno, record.funcName, msg, args,
+                                      exc_text, record.stack_info, record.thread, record.threadName,
+                                      record.process, record.processName, extras)
+            self._next = (self._next + 1) % self.capacity
+            if self._size < self.capacity:
+                self._size += 1
+            return
+        if record.levelno >= self.flush_level:
+            self._dump()
+        self.target.handle(record)
+
+    def _dump(self):
+        """Pass the buffered records to the target, oldest first, and empty the ring.
+        Caller must hold self.lock."""
+        start = (self._next - self._size) % self.capacity
+        for i in range(self._size):
+            slot = (start + i) % self.capacity
+            (created, msecs, relative_created, levelno, levelname, name, pathname, filename, module, lineno,
+             func_name, msg, args, exc_text, stack_info, thread, thread_name, process, process_name,
+             extras) = self._ring[slot]
+            self._ring[slot] = None
+            attributes = dict(
+                created=created, msecs=msecs, relativeCreated=relative_created, levelno=levelno,
+                levelname=levelname, name=name, pathname=pathname, filename=filename, module=module,
+                lineno=lineno, funcName=func_name, msg=msg, args=args, exc_text=exc_text, stack_info=stack_info,
+                thread=thread, threadName=thread_name, process=process, processName=process_name)
+            if extras:
+                attributes.update(extras)
+            self.target.handle(logging.makeLogRecord(attributes))
+        self._size = 0
+
+    def dump(self):
+        """Write the buffered records to the target on demand."""
+        self.acquire()
+        try:
+            self._dump()
+        finally:
+            self.release()
+
+    def flush(self):
+        self.target.flush()
+
+    def close(self):
+        self.target.close()
+        super().close()
+
+
+def compress_file(source, dest, method='gzip'):
+    """Compress source into dest and remove source.
+
+    Parameters
+    ----------
+    source : str
+        File to compress
+    dest : str
+        Compressed output file.  It is written under a temporary name and then renamed
+        so that a partially written dest is never visible.
+    method : 'gzip' | 'zstd'
+        Compression method.  'zstd' requires the zstandard package.
+    """
+    tmp = f'{dest}.tmp'
+    with open(source, 'rb') as f_in:
+        if method == 'gzip':
+            with gzip.open(tmp, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+        elif method == 'zstd':
+            with open(tmp, 'wb') as f_raw, zstandard.ZstdCompressor().stream_writer(f_raw) as f_out:
+                shutil.copyfileobj(f_in, f_out)
+        else:
+            raise ValueError(f'Unknown compression method: {method!r}')
+    os.replace(tmp, dest)
+    os.remove(source)
+
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """File handler with size and/or time based rotation and compression of rotated segments.
+
+    Rotated segments are named "<file>.1<ext>" (newest) to "<file>.<backup_count><ext>" (oldest),
+    where <ext> is '.gz' or '.zst' if compressed.
+    The thread that triggers a rotation only renames the active file,
+    compression is done on a background thread.
+    If rotations outpace compression, the next rotation waits for the previous compression
+    to finish so that segment numbering and retention stay correct.
+    """
+    _executor = None  # shared single background thread for all instances
+
+    def __init__(self, filename, max_bytes=0, interval=0, backup_count=5,
+                 compress=None, encoding=None, delay=False):
+        """
+        Parameters
+        ----------
+        filename : str
+            Log file name
+        max_bytes : int
+            Rotate when the file would exceed max_bytes.  0 to disable size based rotation.
+        interval : float
+            Rotate every interval seconds.  0 to disable time based rotation.
+        backup_count : int
+            Number of rotated segments to keep (at least 1).
+        compress : None | 'gzip' | 'zstd'
+            Compression method applied to rotated segments.
+        """
+        if compress not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f'compress must be one of {tuple(COMPRESSION_EXTENSIONS)}, not {compress!r}')
+        if compress == 'zstd' and zstandard is None:
+            raise ImportError("compress='zstd' requires the zstandard package")
+        if backup_count < 1:
+            raise ValueError('backup_count must be at least 1')
+        super().__init__(filename, mode='a', maxBytes=max_bytes, backupCount=backup_count,
+                         encoding=encoding, delay=delay)
+        self.interval = interval
+        self.compress = compress
+        self.rollover_at = time.time() + interval if interval else None
+        self._pending = None  # future of the most recent background compression
+
+    def segment_name(self, i):
+        """Name of the i'th rotated segment (1 is the newest)."""
+        return f'{self.baseFilename}.{i}{COMPRESSION_EXTENSIONS[self.compress]}'
+
+    def wait_for_compression(self):
+        """Block until the most recent background compression has finished."""
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+
+    def shouldRollover(self, record):
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        # Runs under self.lock (called from emit), so writers wait until the rename is done
+        self.wait_for_compression()
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        for i in range(self.backupCount - 1, 0, -1):
+            sfn = self.segment_name(i)
+            if os.path.exists(sfn):
+                os.replace(sfn, self.segment_name(i + 1))
+
+        if os.path.exists(self.baseFilename):
+            if self.compress is None:
+                os.replace(self.baseFilename, self.segment_name(1))
+            else:
+                rotating = f'{self.baseFilename}.rotating'
+                os.replace(self.baseFilename, rotating)
+                if CompressingRotatingFileHandler._executor is None:
+                    CompressingRotatingFileHandler._executor = \
+                        ThreadPoolExecutor(max_workers=1, thread_name_prefix='log-compress')
+                self._pending = CompressingRotatingFileHandler._executor.submit(
+                    compress_file, rotating, self.segment_name(1), self.compress)
+
+        if self.rollover_at is not None:
+            self.rollover_at = time.time() + self.interval
+        if not self.delay:
+            self.stream = self._open()
+
+    def close(self):
+        self.acquire()
+        try:
+            self.wait_for_compression()
+        finally:
+            self.release()
+        super().close()
+
+
+def emit_threshold(logger):
+    """Lowest level at which a record logged to logger would be emitted by at least one handler.
+
+    Considers the logger's effective level, logging.disable, and the levels of the handlers
+    of the logger and of its parents (while propagate is True).
+    Returns a level above CRITICAL if nothing can be emitted.
+    """
+    never = logging.CRITICAL + 1
+    if logger.disabled:
+        return never
+
+    handler_levels = []
+    current = logger
+    while current:
+        handler_levels.extend(h.level for h in current.handlers)
+        if not current.propagate:
+            break
+        current = current.parent
+    if not handler_levels:
+        handler_levels.append(logging.lastResort.level if logging.lastResort else never)
+
+    return max(logger.getEffectiveLevel(), logger.manager.disable + 1, min(handler_levels))
+
+
+class LazyLogger:
+    """Thin wrapper around a logging.Logger that skips disabled levels as cheaply as possible.
+
+    1) Whether each level will be emitted by some handler is cached (see emit_threshold),
+       so a disabled call costs one attribute lookup and no LogRecord is created.
+    2) msg may be a callable that returns the message, it is only called if the record is emitted.
+       Format args (log.debug('x = %s', x)) are likewise only formatted if the record is emitted.
+    3) Other attributes are delegated to the wrapped logger.
+
+    Call refresh() after changing logger or handler levels, or after adding/removing handlers.
+
+    Example
+    -------
+    log.debug('Module: %s: array = %s', __name__, big_array)
+    log.debug(lambda: f'Expensive summary: {summarize(data)}')
+    """
+    __slots__ = ('logger', '_debug', '_info', '_warning', '_error', '_critical')
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.refresh()
+
+    def refresh(self):
+        """Recompute the cached enabled flag of each level."""
+        threshold = emit_threshold(self.logger)
+        self._debug = logging.DEBUG >= threshold
+        self._info = logging.INFO >= threshold
+        self._warning = logging.WARNING >= threshold
+        self._error = logging.ERROR >= threshold
+        self._critical = logging.CRITICAL >= threshold
+
+    def __getattr__(self, item):
+        return getattr(self.logger, item)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.logger!r}>'
+
+    def is_enabled(self, level):
+        """True if a record at level would be emitted by at least one handler."""
+        return level >= emit_threshold(self.logger)
+
+    def _log(self, level, msg, args, kwargs):
+        if callable(msg):
+            msg = msg()
+        # skip this wrapper's frame when logging finds the caller's file, line and function
+        kwargs['stacklevel'] = kwargs.get('stacklevel', 1) + 2
+        self.logger._log(level, msg, args, **kwargs)
+
+    def debug(self, msg, *args, **kwargs):
+        if self._debug:
+            self._log(logging.DEBUG, msg, args, kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        if self._info:
+            self._log(logging.INFO, msg, args, kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        if self._warning:
+            self._log(logging.WARNING, msg, args, kwargs)
+
+    def error(self, msg, *args, **kwargs):
+        if self._error:
+            self._log(logging.ERROR, msg, args, kwargs)
+
+    def exception(self, msg, *args, exc_info=True, **kwargs):
+        if self._error:
+            self._log(logging.ERROR, msg, args, dict(kwargs, exc_info=exc_info))
+
+    def critical(self, msg, *args, **kwargs):
+        if self._critical:
+            self._log(logging.CRITICAL, msg, args, kwargs)
+
+    def log(self, level, msg, *args, **kwargs):
+        if level >= emit_threshold(self.logger):
+            self._log(level, msg, args, kwargs)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format records as compact, single line JSON objects with the fields
+    timestamp (ISO 8601 UTC), level, logger, module, line, message,
+    any extra= fields, and exc_info/stack_info when present.
+
+    The fixed fields are written with a precompiled template and C accelerated string escaping
+    rather than building a dict per record.  Extra fields are encoded with orjson if it is installed.
+    """
+    template = '{"timestamp":"%s.%03dZ","level":"%s","logger":%s,"module":%s,"line":%d,"message":%s'
+    # attributes present on every LogRecord, anything else was passed with extra=
+    reserved = frozenset(logging.makeLogRecord({}).__dict__) | {'message', 'asctime', TemplateFilter.summary_attr}
+
+    def __init__(self):
+        super().__init__()
+        self._second = (None, '')  # (epoch second, formatted text) of the last record
+
+    @staticmethod
+    def encode_value(value):
+        """Encode an extra= value as JSON, falling back to str for unsupported types."""
+        if orjson is not None:
+            return orjson.dumps(value, default=str).decode()
+        return json.dumps(value, default=str, separators=(',', ':'))
+
+    def format(self, record):
+        second = int(record.created)
+        if self._second[0] != second:
+            self._second = (second, time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second)))
+
+        text = self.template % (self._second[1], record.msecs, record.levelname,
+                                encode_basestring(record.name), encode_basestring(record.module),
+                                record.lineno, encode_basestring(record.getMessage()))
+
+        extras = [key for key in record.__dict__ if key not in self.reserved]
+        if extras:
+            text += ''.join(f',{encode_basestring(key)}:{self.encode_value(record.__dict__[key])}'
+                            for key in extras)
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            text += f',"exc_info":{encode_basestring(record.exc_text)}'
+        if record.stack_info:
+            text += f',"stack_info":{encode_basestring(self.formatStack(record.stack_info))}'
+        return text + '}'
+
+
+# Formatters available for the log file, see SingletonLogger.create_logger
+FILE_FORMATS = {'text': logging.Formatter, 'jsonl': JsonLinesFormatter}
+
+
+class CollectorClientHandler(logging.handlers.QueueHandler):
+    """Handler used in worker processes to send records to the LogCollector of the parent process.
+
+    The connection is opened on the first record, and starts with the logger configuration
+    so the collector can create the same logger if it does not exist yet.
+    Records are prepared by prepare_record (message formatted, args removed, traceback rendered
+    to exc_text) so they can be pickled.
+    """
+    def __init__(self, address, config):
+        """
+        Parameters
+        ----------
+        address :
+            multiprocessing.connection address of the LogCollector
+        config : tuple
+            (name, path, stdout_level, file_level, options) passed to SingletonLogger.get_logger
+            by the collector
+        """
+        super().__init__(None)
+        self.address = address
+        self.config = config
+        self.connection = None
+
+    def prepare(self, record):
+        return prepare_record(record)
+
+    def enqueue(self, record):
+        # handle() holds self.lock, so records from different threads are sent one at a time
+        if self.connection is None:
+            self.connection = Client(self.address, authkey=multiprocessing.current_process().authkey)
+            self.connection.send(self.config)
+        self.connection.send(record)
+
+    def close(self):
+        self.acquire()
+        try:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+        finally:
+            self.release()
+        super().close()
+
+
+class LogCollector:
+    """Receive records from worker processes and pass them to the loggers of this process,
+    so that only one process writes to each log file.
+
+    The collector address is stored in an environment variable, which is inherited by worker
+    processes whether they are started by fork, spawn, or forkserver.
+    Workers authenticate with the multiprocessing authkey, which they also inherit.
+    Processes started otherwise (e.g. with subprocess) inherit the variable but not the authkey,
+    so they ignore it, see parent_address.
+    """
+    env_var = 'TONY_UTIL_LOG_COLLECTOR'
+    # True in the collector process, and so in the processes forked from it, which share its authkey
+    shares_authkey = False
+
+    def __init__(self):
+        self.listener = Listener(authkey=multiprocessing.current_process().authkey)
+        self.address = self.listener.address
+        self.threads = []
+        self._closed = False
+        os.environ[self.env_var] = json.dumps([os.getpid(), self.address])
+        LogCollector.shares_authkey = True
+        self._accept_thread = threading.Thread(target=self._accept, name='log-collector', daemon=True)
+        self._accept_thread.start()
+
+    @classmethod
+    def parent_address(cls):
+        """Address of the collector of a parent process, or None if this process is not a worker:
+        only multiprocessing children and forks of the collector process (or of its workers) have the
+        authkey of the collector, other processes that inherited the environment variable don't."""
+        value = os.environ.get(cls.env_var)
+        if not value:
+            return None
+        pid, address = json.loads(value)
+        if pid == os.getpid():
+            return None
+        if not cls.shares_authkey and multiprocessing.parent_process() is None:
+            return None
+        return tuple(address) if isinstance(address, list) else address
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                connection = self.listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                continue
+            if self._closed:
+                connection.close()
+                return
+            thread = threading.Thread(target=self._serve, args=(connection,), name='log-collector', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    @staticmethod
+    def _serve(connection):
+        """Pass the records received from one worker logger to the logger of the same name."""
+        logger = None
+        with connection:
+            while True:
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    return
+                if isinstance(message, logging.LogRecord):
+                    logger.handle(message)
+                else:
+                    name, path, stdout_level, file_level, options = message
+                    logger = SingletonLogger.get_logger(name, path, stdout_level, file_level, **options)
+
+    def stop(self, timeout=5.0):
+        """Stop accepting workers and wait up to timeout seconds for connected workers to finish."""
+        self._closed = True
+        try:
+            # wake up the accept thread
+            Client(self.address, authkey=multiprocessing.current_process().authkey).close()
+        except OSError:
+            pass
+        self._accept_thread.join(timeout)
+        self.listener.close()
+        deadline = time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        os.environ.pop(self.env_var, None)
+
+
+def counter_value(counter):
+    """Current value of an itertools.count used as a counter.
+    next() on an itertools.count is atomic in CPython, so threads can share it without a lock."""
+    return int(repr(counter)[6:-1])
+
+
+def handler_description(handler):
+    """Short description of a handler for stats, e.g. 'BufferedFileHandler logs/x.log'."""
+    target = getattr(handler, 'baseFilename', None) or getattr(getattr(handler, 'stream', None), 'name', None)
+    return f'{type(handler).__name__} {target}' if target else type(handler).__name__
+
+
+class HandlerStats:
+    """Counters of one handler: records emitted by level, records rejected by the handler's filters,
+    characters written (bytes for ASCII text), and seconds spent in emit.
+
+    handle and format of the handler instance are replaced by counting versions (wrapped if the handler
+    class overrides them), bound to the handler so they cost about as much as the methods they replace.
+    emit_time and chars are updated while the handler's lock is held, so they need no lock of their own,
+    and records are counted with itertools.count objects (see counter_value).
+    A record is counted once in chars however often the handler formats it (e.g. RotatingFileHandler
+    formats it in shouldRollover and again in emit).  Queue handlers only enqueue records, their chars
+    are None and the handlers serviced by their listener count what is written.
+    """
+    def __init__(self, handler):
+        self.handler = handler
+        self.records = {}
+        self.reset()
+        self.formatted = None   # last record counted in chars
+
+        if type(handler).handle is logging.Handler.handle:
+            def counting_handle(self, record, stats=self, records=self.records, clock=time.perf_counter):
+                # logging.Handler.handle with counters
+                rv = self.filter(record)
+                if not rv:
+                    next(stats.filtered)
+                    return rv
+                if isinstance(rv, logging.LogRecord):
+                    record = rv
+                self.acquire()
+                try:
+                    t0 = clock()
+                    self.emit(record)
+                finally:
+                    stats.emit_time += clock() - t0
+                    self.release()
+                try:
+                    next(records[record.levelname])
+                except KeyError:
+                    next(records.setdefault(record.levelname, itertools.count()))
+                return rv
+        else:
+            def counting_handle(self, record, stats=self, records=self.records, clock=time.perf_counter,
+                                handle=handler.handle):
+                t0 = clock()
+                rv = handle(record)
+                if rv:
+                    stats.emit_time += clock() - t0
+                    try:
+                        next(records[record.levelname])
+                    except KeyError:
+                        next(records.setdefault(record.levelname, itertools.count()))
+                else:
+                    next(stats.filtered)
+                return rv
+        handler.handle = types.MethodType(counting_handle, handler)
+
+        if isinstance(handler, logging.handlers.QueueHandler):
+            self.chars = None
+            return
+        terminator = len(getattr(handler, 'terminator', ''))
+        if type(handler).format is logging.Handler.format:
+            def counting_format(self, record, stats=self, terminator=terminator):
+                text = (self.formatter or logging._defaultFormatter).format(record)
+                if record is not stats.formatted:
+                    stats.formatted = record
+                    stats.chars += len(text) + terminator
+                return text
+        else:
+            def counting_format(self, record, stats=self, terminator=terminator, format_=handler.format):
+                text = format_(record)
+                if record is not stats.formatted:
+                    stats.formatted = record
+                    stats.chars += len(text) + terminator
+                return text
+        handler.format = types.MethodType(counting_format, handler)
+
+    def reset(self):
+        self.records.clear()
+        self.filtered = itertools.count()
+        if getattr(self, 'chars', 0) is not None:
+            self.chars = 0
+        self.emit_time = 0.0
+
+    def snapshot(self):
+        return {'handler': handler_description(self.handler),
+                'records': {level: counter_value(c) for level, c in list(self.records.items())},
+                'filtered': counter_value(self.filtered), 'bytes': self.chars, 'emit_time': self.emit_time}
+
+
+class LoggerStats:
+    """Counters of one logger: records handled by level, records rejected by the logger's filters
+    (rate limit, duplicates), and the HandlerStats of its handlers.
+
+    Logger.handle runs without a lock, so its counters are itertools.count objects (see counter_value).
+    """
+    def __init__(self, logger):
+        self.logger = logger
+        self.records = {}
+        self.reset()
+
+        def counting_handle(self, record, stats=self, records=self.records):
+            # logging.Logger.handle with counters
+            try:
+                next(records[record.levelname])
+            except KeyError:
+                next(records.setdefault(record.levelname, itertools.count()))
+            if self.disabled:
+                return
+            rv = self.filter(record)
+            if not rv:
+                next(stats.filtered)
+                return
+            if isinstance(rv, logging.LogRecord):
+                record = rv
+            self.callHandlers(record)
+
+        logger.handle = types.MethodType(counting_handle, logger)
+
+    def reset(self):
+        self.records.clear()
+        self.filtered = itertools.count()
+        self.handlers = []
+
+    def add_handlers(self, *handlers):
+        """Track handlers (once each), including handlers serviced by a queue listener."""
+        for handler in handlers:
+            if not any(stats.handler is handler for stats in self.handlers):
+                self.handlers.append(HandlerStats(handler))
+
+    def snapshot(self):
+        return {'records': {level: counter_value(c) for level, c in list(self.records.items())},
+                'filtered': counter_value(self.filtered),
+                'handlers': [stats.snapshot() for stats in self.handlers]}
+
+
 class SingletonLogger:
     """Application level logger with the following characteristics:
         1) Loggers with the same name will be shared application-wide
@@ -51,8 +1042,28 @@ class SingletonLogger:
         3) WARNING or greater logs go to sys.stderr
         4) log level for sys.stdout can be set (default is INFO).
         3) The file name of the log file is: "<path>/<name>.log"
+        5) Optionally (buffered=True) file writes are batched by size and time.
+        6) Optionally the log file is rotated by size and/or time and old segments are compressed.
+        7) Optionally (queue=True) callers only push records onto a bounded queue
+           and a background listener thread owns the file, stdout, and stderr handlers.
+        8) Optionally (format='jsonl') the log file is written as JSON lines.
+        9) get_lazy_logger returns a LazyLogger wrapper that skips disabled levels cheaply.
+        10) Optionally (multiprocess=True) worker processes send their records to the process
+            that created the logger first, which is the only one that writes the log file.
+        11) Optionally repeated messages are rate limited and/or collapsed.
+        12) Optionally (ring_buffer=N) DEBUG records for the file are kept in memory
+            and only written when an ERROR occurs.
+        13) Records, filtered records, bytes, and emit time of each logger and handler are counted
+            (see stats), unless the logger is created with track_stats=False.
         """
     loggers = {}
+    lazy_loggers = {}
+    listeners = {}              # name -> (QueueOverflowHandler, BoundedQueueListener) for queue=True loggers
+    multiprocess_configs = {}   # name -> get_logger arguments for multiprocess=True loggers
+    collector = None            # LogCollector of this process, if it created a multiprocess=True logger
+    logger_stats = {}           # name -> LoggerStats of loggers created with track_stats=True
+    stats_dumper = None         # (threading.Event, threading.Thread) of start_stats_dump
+    _shutdown_registered = False
     np.set_printoptions(linewidth=200)
 
     @classmethod
@@ -61,6 +1072,7 @@ class SingletonLogger:
                    path='logs',
                    stdout_level=logging.INFO,
                    file_level=logging.DEBUG,
+                   **kwargs,
                    ):
         """Get logger if it exists, otherwise create it..
 
@@ -78,23 +1090,69 @@ class SingletonLogger:
             file_level: int
                 logging level for output file.
 
+            **kwargs:
+                Additional handler options used if the logger is created (e.g. queue, buffered).
+                See create_logger.
+
             Returns
             -------
             logger : logging
                 Application wide logger named 'name'
             """
         if name not in SingletonLogger.loggers:
-            SingletonLogger.create_logger(name, path, stdout_level, file_level)
+            SingletonLogger.create_logger(name, path, stdout_level, file_level, **kwargs)
             log = SingletonLogger.loggers[name]
             log.info(f'Logger created at: {datetime.datetime.now()}')
 
         return SingletonLogger.loggers[name]
 
+    @classmethod
+    def get_lazy_logger(cls, name='my_logger', *args, **kwargs):
+        """Get a LazyLogger wrapping the logger named 'name', creating the logger if required.
+
+            Parameters
+            ----------
+            name : str
+                Name of logger
+
+            *args, **kwargs:
+                Passed to get_logger
+
+            Returns
+            -------
+            logger : LazyLogger
+                Wrapper of the application wide logger named 'name'
+            """
+        if name not in SingletonLogger.lazy_loggers:
+            SingletonLogger.lazy_loggers[name] = LazyLogger(SingletonLogger.get_logger(name, *args, **kwargs))
+        return SingletonLogger.lazy_loggers[name]
+
     @classmethod
     def create_logger(cls, name='my_logger',
                       path='logs',
                       stdout_level=logging.INFO,
                       file_level=logging.DEBUG,
+                      queue=False,
+                      queue_size=10000,
+                      overflow='block',
+                      buffered=False,
+                      buffer_bytes=64 * 1024,
+                      flush_interval=1.0,
+                      rotate_bytes=0,
+                      rotate_interval=0,
+                      backup_count=5,
+                      compress=None,
+                      format='text',
+                      multiprocess=False,
+                      rate_limit=None,
+                      rate_burst=10,
+                      collapse_duplicates=False,
+                      duplicate_timeout=60.0,
+                      max_templates=1000,
+                      ring_buffer=0,
+                      ring_pass_level=logging.INFO,
+                      ring_flush_level=logging.ERROR,
+                      track_stats=True,
                       ):
         """Create logger named 'name' and add it to the class level dictionary
 
@@ -112,6 +1170,80 @@ class SingletonLogger:
         file_level: int
             logging level for output file.
 
+        queue: bool
+            True to log through a bounded queue serviced by a background thread.
+            Callers only pay for the enqueue, the listener thread does the file and terminal writes.
+
+        queue_size: int
+            Maximum number of records held in the queue (queue=True only).
+
+        overflow: 'block' | 'drop_oldest' | 'drop'
+            Behavior when the queue is full (queue=True only).  See QueueOverflowHandler.
+
+        buffered: bool
+            True to batch file writes with a BufferedFileHandler rather than flushing every record.
+
+        buffer_bytes: int
+            Buffered characters that trigger a write to the log file (buffered=True only).
+
+        flush_interval: float
+            Seconds after which buffered records are written at the next record (buffered=True only).
+
+        rotate_bytes: int
+            Rotate the log file when it would exceed this size.  0 disables size based rotation.
+
+        rotate_interval: float
+            Rotate the log file every rotate_interval seconds.  0 disables time based rotation.
+
+        backup_count: int
+            Number of rotated log files to keep (rotation only).
+
+        compress: None | 'gzip' | 'zstd'
+            Compress rotated log files on a background thread (rotation only).
+            See CompressingRotatingFileHandler.
+
+        format: 'text' | 'jsonl'
+            Log file format.  'jsonl' writes one JSON object per record, see JsonLinesFormatter.
+            stdout and stderr remain plain text.
+
+        multiprocess: bool
+            True to share the logger with worker processes (multiprocessing, process pools).
+            The first process to create the logger owns its handlers and starts a LogCollector.
+            In worker processes, the same call creates a logger that sends its records
+            to the collector instead of opening the log file.
+
+        rate_limit: float | None
+            Records per second allowed for each (level, message template), see RateLimitFilter.
+            None for no rate limit.
+
+        rate_burst: int
+            Records each message template may log at once before rate limiting starts.
+
+        collapse_duplicates: bool
+            True to collapse repeated identical messages, see DuplicateFilter.
+
+        duplicate_timeout: float
+            Seconds after which the repeat count of a collapsed message is logged even if no other
+            message arrives (collapse_duplicates=True only).  0 to only log it at the next message.
+
+        max_templates: int
+            Number of message templates tracked by the rate limit and duplicate filters.
+
+        ring_buffer: int
+            If > 0, file records below ring_pass_level are kept in an in-memory ring of this many records
+            and only written to the log file when a record at ring_flush_level or greater arrives.
+            See RingBufferHandler.
+
+        ring_pass_level: int
+            File records at this level or greater are written immediately (ring_buffer > 0 only).
+
+        ring_flush_level: int
+            Records at this level or greater write the ring to the log file (ring_buffer > 0 only).
+
+        track_stats: bool
+            Count records, filtered records, bytes, and emit time of the logger and its handlers.
+            See stats.
+
         Returns
         -------
         logger : logging
@@ -125,6 +1257,31 @@ class SingletonLogger:
                           "\nso that these modifications will be applied to all references of the logger.")
             return
 
+        if format not in FILE_FORMATS:
+            raise ValueError(f'format must be one of {tuple(FILE_FORMATS)}, not {format!r}')
+
+        if multiprocess:
+            options = dict(queue=queue, queue_size=queue_size, overflow=overflow,
+                           buffered=buffered, buffer_bytes=buffer_bytes, flush_interval=flush_interval,
+                           rotate_bytes=rotate_bytes, rotate_interval=rotate_interval,
+                           backup_count=backup_count, compress=compress, format=format,
+                           rate_limit=rate_limit, rate_burst=rate_burst,
+                           collapse_duplicates=collapse_duplicates, duplicate_timeout=duplicate_timeout,
+                           max_templates=max_templates,
+                           ring_buffer=ring_buffer, ring_pass_level=ring_pass_level,
+                           ring_flush_level=ring_flush_level, track_stats=track_stats)
+            SingletonLogger.multiprocess_configs[name] = (name, path, stdout_level, file_level, options)
+            address = LogCollector.parent_address()
+            if address is not None:
+                logger = logging.getLogger(name)
+                logger.setLevel(logging.DEBUG)
+                logger.addHandler(CollectorClientHandler(address, SingletonLogger.multiprocess_configs[name]))
+                if track_stats:
+                    SingletonLogger.logger_stats[name] = LoggerStats(logger)
+                    SingletonLogger.logger_stats[name].add_handlers(*logger.handlers)
+                SingletonLogger.loggers[name] = logger
+                return logger
+
         # create path if it does not exist yet
         if os.path.isfile(path):
             raise FileExistsError(f'Attempt to create a directory that is already a regular file:\n {path}')
@@ -137,9 +1294,30 @@ class SingletonLogger:
         logger = logging.getLogger(name)
         logger.setLevel(logging.DEBUG)
         # logger.setLevel(logging.INFO)
+        if collapse_duplicates:
+            logger.addFilter(DuplicateFilter(max_templates=max_templates, timeout=duplicate_timeout))
+        if rate_limit is not None:
+            logger.addFilter(RateLimitFilter(rate=rate_limit, burst=rate_burst, max_templates=max_templates))
+        if collapse_duplicates or rate_limit is not None:
+            # log the pending repeat and suppressed counts at exit
+            SingletonLogger.register_shutdown()
 
-        fh = logging.FileHandler(file_name)
+        if rotate_bytes or rotate_interval:
+            if buffered:
+                raise ValueError('buffered=True cannot be combined with log rotation')
+            fh = CompressingRotatingFileHandler(file_name, max_bytes=rotate_bytes, interval=rotate_interval,
+                                                backup_count=backup_count, compress=compress)
+        elif buffered:
+            fh = BufferedFileHandler(file_name, buffer_bytes=buffer_bytes, flush_interval=flush_interval)
+        else:
+            fh = logging.FileHandler(file_name)
         fh.setLevel(file_level)
+        fh.setFormatter(FILE_FORMATS[format]())
+        file_handlers = [fh]
+        if ring_buffer:
+            fh = RingBufferHandler(ring_buffer, fh, pass_level=ring_pass_level, flush_level=ring_flush_level)
+            fh.setLevel(file_level)
+            file_handlers.insert(0, fh)
 
         sh_err = logging.StreamHandler(stream=sys.stderr)
         sh_err.setLevel(logging.WARNING)
@@ -148,13 +1326,151 @@ class SingletonLogger:
         sh_out.setLevel(stdout_level)
         sh_out.addFilter(FilterOutWarningsErrors())
 
-        logger.addHandler(fh)
-        logger.addHandler(sh_err)
-        logger.addHandler(sh_out)
+        if multiprocess and SingletonLogger.collector is None:
+            SingletonLogger.collector = LogCollector()
+            SingletonLogger.register_shutdown()
+
+        if queue:
+            qh = QueueOverflowHandler(Queue(maxsize=queue_size), overflow=overflow)
+            # don't enqueue records that none of the listener's handlers would emit
+            qh.setLevel(min(fh.level, sh_err.level, sh_out.level))
+            listener = BoundedQueueListener(qh.queue, fh, sh_err, sh_out, respect_handler_level=True)
+            listener.start()
+            logger.addHandler(qh)
+            SingletonLogger.listeners[name] = (qh, listener)
+            SingletonLogger.register_shutdown()
+        else:
+            logger.addHandler(fh)
+            logger.addHandler(sh_err)
+            logger.addHandler(sh_out)
+
+        if track_stats:
+            stats = SingletonLogger.logger_stats[name] = LoggerStats(logger)
+            stats.add_handlers(*logger.handlers, *file_handlers, sh_err, sh_out)
 
         SingletonLogger.loggers[name] = logger
         return logger
 
+    @classmethod
+    def stats(cls):
+        """Snapshot of the counters of every logger created with track_stats=True.
+
+        Counters are read without locks while other threads log, so a snapshot may miss
+        the records being logged at that moment.
+
+        Returns
+        -------
+        stats : dict
+            name -> {'records': {level name: records handled by the logger},
+                     'filtered': records rejected by the logger's filters,
+                     'queue_depth', 'queue_dropped': records waiting in / dropped from the queue (queue=True only),
+                     'handlers': [{'handler': description, 'records': {level name: records emitted},
+                                   'filtered': records rejected by the handler's filters,
+                                   'bytes': characters written (None for queue handlers),
+                                   'emit_time': seconds in emit}]}
+        """
+        snapshot = {}
+        for name, stats in list(SingletonLogger.logger_stats.items()):
+            snapshot[name] = stats.snapshot()
+            if name in SingletonLogger.listeners:
+                qh = SingletonLogger.listeners[name][0]
+                snapshot[name]['queue_depth'] = qh.queue.qsize()
+                snapshot[name]['queue_dropped'] = qh.dropped
+        return snapshot
+
+    @classmethod
+    def dump_stats(cls, name='logging_stats'):
+        """Log stats() as one JSON record to the logger named name."""
+        SingletonLogger.get_logger(name).info(json.dumps(SingletonLogger.stats()))
+
+    @classmethod
+    def start_stats_dump(cls, interval=60.0, name='logging_stats'):
+        """Call dump_stats every interval seconds on a daemon thread, until stop_stats_dump or shutdown."""
+        SingletonLogger.stop_stats_dump()
+        SingletonLogger.get_logger(name)
+        stop = threading.Event()
+
+        def dump():
+            while not stop.wait(interval):
+                SingletonLogger.dump_stats(name)
+
+        thread = threading.Thread(target=dump, name='logging stats', daemon=True)
+        thread.start()
+        SingletonLogger.stats_dumper = (stop, thread)
+        SingletonLogger.register_shutdown()
+
+    @classmethod
+    def stop_stats_dump(cls):
+        """Stop the periodic stats dump."""
+        if SingletonLogger.stats_dumper is not None:
+            stop, thread = SingletonLogger.stats_dumper
+            stop.set()
+            thread.join()
+            SingletonLogger.stats_dumper = None
+
+    @classmethod
+    def register_shutdown(cls):
+        """Register shutdown with atexit (once)."""
+        if not SingletonLogger._shutdown_registered:
+            atexit.register(SingletonLogger.shutdown)
+            SingletonLogger._shutdown_registered = True
+
+    @classmethod
+    def shutdown(cls):
+        """Log the repeat and suppressed counts pending in duplicate and rate limit filters,
+        stop the periodic stats dump, stop the LogCollector (waiting briefly for workers still sending records),
+        drain the queues of all queue=True loggers, stop their listener threads, and flush handlers.
+        Registered with atexit when the first queue=True, multiprocess=True,
+        collapse_duplicates=True, or rate limited logger is created.
+        Loggers fall back to writing directly to their handlers afterwards."""
+        SingletonLogger.stop_stats_dump()
+        for logger in list(SingletonLogger.loggers.values()):
+            for f in logger.filters:
+                if isinstance(f, TemplateFilter):
+                    f.flush()
+        if SingletonLogger.collector is not None:
+            SingletonLogger.collector.stop()
+            SingletonLogger.collector = None
+
+        while SingletonLogger.listeners:
+            name, (qh, listener) = SingletonLogger.listeners.popitem()
+            logger = SingletonLogger.loggers[name]
+            logger.removeHandler(qh)
+            listener.stop()
+            for handler in listener.handlers:
+                handler.flush()
+                logger.addHandler(handler)
+            if name in SingletonLogger.lazy_loggers:
+                SingletonLogger.lazy_loggers[name].refresh()
+            if qh.dropped:
+                logger.warning(f'Logger queue overflow ({qh.overflow}): {qh.dropped} records dropped')
+
+    @classmethod
+    def after_fork_in_child(cls):
+        """Turn the multiprocess=True loggers inherited by a forked worker into collector clients.
+        The worker must not write to the parent's handlers (or queues serviced by parent threads)."""
+        address = LogCollector.parent_address()
+        if address is None:
+            return
+        SingletonLogger.collector = None
+        for name, config in SingletonLogger.multiprocess_configs.items():
+            logger = SingletonLogger.loggers[name]
+            for handler in list(logger.handlers):
+                # don't close, a buffered handler would write the parent's pending records again
+                logger.removeHandler(handler)
+            SingletonLogger.listeners.pop(name, None)
+            logger.addHandler(CollectorClientHandler(address, config))
+            if name in SingletonLogger.logger_stats:
+                # the parent's counters and handlers don't belong to this process
+                SingletonLogger.logger_stats[name].reset()
+                SingletonLogger.logger_stats[name].add_handlers(*logger.handlers)
+            if name in SingletonLogger.lazy_loggers:
+                SingletonLogger.lazy_loggers[name].refresh()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=SingletonLogger.after_fork_in_child)
+
 
 if __name__ == "__main__":
 
@@ -8,11 +8,27 @@ Copyright © 2020 Tony Held.  All rights reserved.
 """
 
 import traceback
+import linecache
+import ast
+import reprlib
+import itertools
+import mmap
 import os
+import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
+# (filename, line number) -> source statement, memo used by my_calling_statement
+statement_cache = {}
 
-def stack_info(stack_print=True, short_filename=True):
+# (code object, instruction offset) -> argument source text, memo used by calling_arguments
+arguments_cache = {}
+
+# filename -> (source, {(lineno, end_lineno, col_offset, end_col_offset): ast.Call}), used by calling_arguments
+call_index_cache = {}
+
+
+def stack_info(stack_print=True, short_filename=True, frame=None):
     """Inspect the call stack to learn how a methods are invoked.
 
     Parameters
@@ -21,6 +37,9 @@ def stack_info(stack_print=True, short_filename=True):
         Flag to print full contents of the stack.
     short_filename : boolean
         Option to use simple file names rather than the full path
+    frame : frame
+        Innermost frame of the stack to inspect, e.g. another thread's frame from sys._current_frames().
+        The stack of the caller if None.
     Returns
     -------
     filenames : []
@@ -39,7 +58,7 @@ def stack_info(stack_print=True, short_filename=True):
     You will likely want stack_index -2 or -3 to see your line of code of interest
     """
     # Find the current callback stack
-    stack_calls = traceback.extract_stack()
+    stack_calls = traceback.extract_stack(frame)
 
     # Initialize lists to store callback information
     filenames = []
@@ -86,8 +105,22 @@ def my_calling_statement(stack_index=-3):
     -------
     You will likely want stack_index -2 or -3 to see your line of code of interest
     See stack_info for details
+
+    Negative indices walk back from this frame with sys._getframe rather than extracting the whole stack,
+    and the source line is only read once per (filename, line number).
     """
-    filename, linenum, function_name, statement = traceback.extract_stack()[stack_index]
+    if stack_index >= 0:
+        filename, linenum, function_name, statement = traceback.extract_stack()[stack_index]
+        return statement
+
+    try:
+        frame = sys._getframe(-stack_index - 1)
+    except ValueError:
+        raise IndexError('stack_index out of range') from None
+    key = (frame.f_code.co_filename, frame.f_lineno)
+    statement = statement_cache.get(key)
+    if statement is None:
+        statement = statement_cache[key] = linecache.getline(*key, frame.f_globals).strip()
     return statement
 
 
@@ -113,6 +146,107 @@ def function_arguments(func_call):
     return str_args
 
 
+def call_index(filename, module_globals=None):
+    """Parse a source file once and index its function calls by source position.
+
+    Parameters
+    ----------
+    filename : str
+        Source file name (as found in a code object)
+    module_globals : dict
+        Globals of the module, used by linecache to find the source of imported modules
+    Returns
+    -------
+    source : str
+        Source of the file ('' if unavailable)
+    calls : {(lineno, end_lineno, col_offset, end_col_offset): ast.Call}
+        Call nodes keyed by position, in the same form as code.co_positions()
+    """
+    if filename not in call_index_cache:
+        source = ''.join(linecache.getlines(filename, module_globals))
+        calls = {}
+        try:
+            tree = ast.parse(source)
+        except (SyntaxError, ValueError):
+            tree = None
+        if tree is not None:
+            for node in ast.walk(tree):
+                if isinstance(node, ast.Call):
+                    calls[(node.lineno, node.end_lineno, node.col_offset, node.end_col_offset)] = node
+        call_index_cache[filename] = (source, calls)
+    return call_index_cache[filename]
+
+
+def find_call_node(frame, func_name):
+    """Find the ast.Call node that frame is currently executing.
+
+    Uses the exact source position of the current instruction (code.co_positions, Python 3.11+).
+    Otherwise falls back to the first call of func_name that spans the frame's current line.
+
+    Parameters
+    ----------
+    frame : frame
+        Frame that is executing the call
+    func_name : str
+        Name of the called function, used by the fall back search
+    Returns
+    -------
+    source : str
+        Source of the frame's file
+    node : ast.Call | None
+        Call node, None if it could not be found
+    """
+    code = frame.f_code
+    source, calls = call_index(code.co_filename, frame.f_globals)
+
+    if hasattr(code, 'co_positions'):
+        for i, positions in enumerate(code.co_positions()):
+            if i == frame.f_lasti // 2:
+                if positions in calls:
+                    return source, calls[positions]
+                break
+
+    line = frame.f_lineno
+    for node in sorted(calls.values(), key=lambda n: (n.lineno, n.col_offset)):
+        name = getattr(node.func, 'id', getattr(node.func, 'attr', None))
+        if name == func_name and node.lineno <= line <= node.end_lineno:
+            return source, node
+    return source, None
+
+
+def calling_arguments(depth=2):
+    """Find the source text of the positional arguments of the call that invoked a function.
+
+    Called from within function f, calling_arguments() returns the arguments as written in the
+    statement that called f.  For example, print_all(g(a, b), c) gives ['g(a, b)', 'c'].
+    Nested calls, strings containing commas, and calls spanning several lines are supported.
+
+    Parameters
+    ----------
+    depth : int
+        Frame that made the call of interest, 2 is the caller of the function calling calling_arguments.
+    Returns
+    -------
+    arguments : [str]
+        Source text of each positional argument, empty if the source is not available
+    Notes
+    -------
+    Results are cached per (code object, instruction offset) of the calling frame,
+    so repeated calls from the same place only cost a dictionary lookup.
+    """
+    frame = sys._getframe(depth)
+    key = (frame.f_code, frame.f_lasti)
+    arguments = arguments_cache.get(key)
+    if arguments is None:
+        source, node = find_call_node(frame, sys._getframe(depth - 1).f_code.co_name)
+        if node is None:
+            arguments = []
+        else:
+            arguments = [ast.get_source_segment(source, arg) for arg in node.args]
+        arguments_cache[key] = arguments
+    return arguments
+
+
 def get_max_char(x, max_char=500):
     """Trim a string to a maximum number of characters to avoid printing excessive text.
 
@@ -134,6 +268,120 @@ def get_max_char(x, max_char=500):
     return y
 
 
+class BoundedRepr(reprlib.Repr):
+    """reprlib.Repr that limits the work done to produce about max_char characters.
+
+    Containers only format as many elements as could fit in max_char,
+    numpy arrays are summarized with numpy.array2string, and pandas objects are rendered
+    with a limited number of rows and columns, so the full repr of a large object is never built.
+    Objects without a handler fall back to repr (or str) and are then truncated.
+
+    Support for other types is added in the reprlib way, with a method named repr_<type name>.
+    For example, repr_DataFrame handles pandas.DataFrame.
+    numpy and pandas are never imported here, they are already loaded if one of their objects is passed.
+
+    Parameters
+    ----------
+    max_char : int
+        Approximate maximum number of characters of the result
+    output_mode : '!s' | '!r'
+        Format the top level object like str ('!s') or repr ('!r')
+    """
+    def __init__(self, max_char=500, output_mode='!r'):
+        super().__init__()
+        self.max_char = max_char
+        self.output_mode = output_mode
+        # each element of a container uses at least ~3 characters ("1, ")
+        n_items = max(6, max_char // 3)
+        self.maxlist = self.maxtuple = self.maxset = self.maxfrozenset = n_items
+        self.maxdeque = self.maxarray = n_items
+        self.maxdict = max(4, max_char // 6)
+        self.maxstring = self.maxlong = self.maxother = max_char
+
+    def top_level_str(self, level):
+        return self.output_mode == '!s' and level == self.maxlevel
+
+    def repr_str(self, x, level):
+        if self.top_level_str(level):
+            return x[:self.max_char + 1]
+        return super().repr_str(x, level)
+
+    def repr_instance(self, x, level):
+        if self.top_level_str(level):
+            return str(x)[:self.max_char + 1]
+        if level == self.maxlevel:
+            return repr(x)[:self.max_char + 1]
+        return super().repr_instance(x, level)
+
+    # reprlib sorts dicts and sets, which touches every item, so keep their iteration order instead
+    def repr_dict(self, x, level):
+        if not x:
+            return '{}'
+        if level <= 0:
+            return '{...}'
+        pieces = [f'{self.repr1(k, level - 1)}: {self.repr1(v, level - 1)}'
+                  for k, v in itertools.islice(x.items(), self.maxdict)]
+        if len(x) > self.maxdict:
+            pieces.append('...')
+        return '{%s}' % ', '.join(pieces)
+
+    def repr_set(self, x, level):
+        if not x:
+            return 'set()'
+        return self._repr_iterable(x, level, '{', '}', self.maxset)
+
+    def repr_frozenset(self, x, level):
+        if not x:
+            return 'frozenset()'
+        return self._repr_iterable(x, level, 'frozenset({', '})', self.maxfrozenset)
+
+    # reprlib picks these by the bare type name, so classes of other libraries with the same name
+    # (e.g. polars.Series) are checked for and handled like any other object
+    def repr_ndarray(self, x, level):
+        np = sys.modules.get('numpy')
+        if np is None or not isinstance(x, np.ndarray):
+            return self.repr_instance(x, level)
+        if self.top_level_str(level):
+            return np.array2string(x, threshold=self.maxlist, edgeitems=3)
+        return 'array(' + np.array2string(x, threshold=self.maxlist, edgeitems=3,
+                                          separator=', ', prefix='array(') + ')'
+
+    def repr_DataFrame(self, x, level):
+        pd = sys.modules.get('pandas')
+        if pd is None or not isinstance(x, pd.DataFrame):
+            return self.repr_instance(x, level)
+        return x.to_string(max_rows=max(2, self.max_char // 40), max_cols=max(2, self.max_char // 20))
+
+    def repr_Series(self, x, level):
+        pd = sys.modules.get('pandas')
+        if pd is None or not isinstance(x, pd.Series):
+            return self.repr_instance(x, level)
+        return x.to_string(max_rows=max(2, self.max_char // 20))
+
+
+def bounded_repr(obj, max_char=500, output_mode='!r'):
+    """Convert obj to a string of at most max_char characters without building its full representation.
+
+    Parameters
+    ----------
+    obj :
+        Object to convert
+    max_char : int
+        Maximum number of characters to keep
+    output_mode : '!s' | '!r'
+        Convert like str ('!s') or repr ('!r')
+    Returns
+    -------
+    text : str
+        String representation, truncated with a note if it exceeded max_char.
+        See BoundedRepr for the types that are bounded before they are converted.
+    """
+    text = BoundedRepr(max_char, output_mode).repr(obj)
+    if len(text) > max_char:
+        text = f"{text[:max_char]} ... <1st {max_char} shown, remainder suppressed>"
+    return text
+
+
 def func1(arg1='mytext1'):
     func2('Simple String Argument')
 
@@ -147,7 +395,7 @@ def func2(arg2='mytext1'):
     print(z)
 
 
-def print_all(*args, output_mode='!s'):
+def print_all(*args, output_mode='!s', max_char=None):
     """Diagnostic to output a list of variables and their values each on their own line.
      This helps to make debugging print statements faster to type.
 
@@ -158,15 +406,20 @@ def print_all(*args, output_mode='!s'):
     output_mode : str
         Selects whether the __str__ or __repr__ function will be invoke in string conversion.
         Can be either '!r' for repr or '!s' for str
+    max_char : int
+        Maximum number of characters printed per variable (see bounded_repr).
+        None prints the full value.
     Returns
     -------
     """
-    # get variable names from the stack call
-    mcs = my_calling_statement()
-    fa = function_arguments(mcs)
+    # get variable names from the source of the call, numbering any that can't be found
+    fa = calling_arguments()
+    fa = fa + [f'argument {i}' for i in range(len(fa), len(args))]
     # Always print the variable names with !s, but use the output_mode to for variable content
     for i, j in zip(fa, args):
-        if output_mode == '!s':
+        if max_char is not None:
+            print('--- {!s} ---\n{!s}'.format(i, bounded_repr(j, max_char, output_mode)))
+        elif output_mode == '!s':
             print('--- {!s} ---\n{!s}'.format(i, j))
         elif output_mode == '!r':
             print('--- {!s} ---\n{!r}'.format(i, j))
@@ -182,6 +435,154 @@ def findall(p, s):
         i = s.find(p, i+1)
 
 
+class MultiPatternSearch:
+    """Find all (possibly overlapping) occurrences of many literal patterns in a single pass.
+
+    The patterns are combined into one compiled regular expression automaton,
+    an alternation ordered longest first, which finds the longest pattern starting at a position.
+    Every other pattern starting at that position is a prefix of the longest one,
+    so those are reported from a precomputed prefix table.
+    If no pattern can overlap another occurrence, the automaton scans the text in one finditer pass,
+    otherwise the search resumes one character after each occurrence.
+    Results are the same as calling findall once per pattern, but the text is scanned once.
+
+    Example
+    -------
+    mps = MultiPatternSearch(['ERROR', 'WARNING', 'timeout'])
+    for pattern, offset in mps.finditer(text): ...
+    for pattern, offset in mps.search_file('service.log', processes=8): ...
+    """
+    def __init__(self, patterns):
+        """
+        Parameters
+        ----------
+        patterns : iterable of str | iterable of bytes
+            Literal patterns to search for (empty patterns are ignored)
+        """
+        self.patterns = list(dict.fromkeys(p for p in patterns if p))
+        if not self.patterns:
+            raise ValueError('At least one non-empty pattern is required')
+        self.max_len = max(len(p) for p in self.patterns)
+        # a later occurrence can start inside an earlier one if a proper suffix of one pattern
+        # and another pattern are prefixes of each other
+        self.overlapping = any(q.startswith(p[k:]) or p[k:].startswith(q)
+                               for p in self.patterns for q in self.patterns for k in range(1, len(p)))
+
+        # str patterns are also compiled as utf-8 bytes to search files and mmaps
+        self._automata = {}
+        if isinstance(self.patterns[0], str):
+            self._automata[str] = self._compile(self.patterns)
+            self._automata[bytes] = self._compile([p.encode() for p in self.patterns], self.patterns)
+            self.max_bytes = max(len(p.encode()) for p in self.patterns)
+        else:
+            self._automata[bytes] = self._compile(self.patterns)
+            self.max_bytes = self.max_len
+
+    @staticmethod
+    def _compile(patterns, originals=None):
+        """Compile patterns into (regex, {matched text: [original patterns, longest first]})."""
+        originals = originals or patterns
+        ordered = sorted(patterns, key=len, reverse=True)
+        if isinstance(patterns[0], bytes):
+            regex = re.compile(b'|'.join(map(re.escape, ordered)))
+        else:
+            regex = re.compile('|'.join(map(re.escape, ordered)))
+        original = dict(zip(patterns, originals))
+        matches = {p: [original[q] for q in ordered if p.startswith(q)] for p in patterns}
+        return regex, matches
+
+    def finditer(self, data, start=0, end=None):
+        """Yield (pattern, offset) for every occurrence of every pattern in data, in offset order.
+
+        Parameters
+        ----------
+        data : str | bytes | bytearray | memoryview | mmap.mmap
+            Text to search.  Offsets in binary data are byte offsets.
+        start, end : int
+            Only report occurrences that start in data[start:end]
+        """
+        regex, matches = self._automata[str if isinstance(data, str) else bytes]
+        end = len(data) if end is None else end
+        endpos = min(len(data), end + self.max_bytes - 1)
+        if self.overlapping:
+            search = regex.search
+            m = search(data, start, endpos)
+            while m is not None:
+                offset = m.start()
+                if offset >= end:
+                    return
+                for pattern in matches[m.group()]:
+                    yield pattern, offset
+                m = search(data, offset + 1, endpos)
+        else:
+            for m in regex.finditer(data, start, endpos):
+                offset = m.start()
+                if offset >= end:
+                    return
+                for pattern in matches[m.group()]:
+                    yield pattern, offset
+
+    def search_stream(self, f, chunk_size=1 << 24):
+        """Yield (pattern, offset) for a binary file object read in chunks of chunk_size bytes.
+
+        The last max_bytes - 1 bytes of each chunk are carried over to the next one,
+        so occurrences that cross a chunk boundary are found exactly once.
+        """
+        overlap = self.max_bytes - 1
+        base = 0         # file offset of buffer[0]
+        buffer = b''
+        while True:
+            chunk = f.read(chunk_size)
+            buffer += chunk
+            last = not chunk
+            # only report occurrences that can't extend past the end of the buffer
+            end = len(buffer) if last else len(buffer) - overlap
+            if end > 0:
+                for pattern, offset in self.finditer(buffer, 0, end):
+                    yield pattern, base + offset
+                base += end
+                buffer = buffer[end:]
+            if last:
+                return
+
+    def search_file(self, filename, processes=None, split_size=1 << 28):
+        """Yield (pattern, byte offset) for every occurrence in a file, in offset order.
+
+        The file is memory mapped, so it is not read into memory.
+        With processes > 1, the file is split into ranges of split_size bytes
+        that are searched by a process pool.
+
+        Parameters
+        ----------
+        filename : str
+            File to search
+        processes : int | None
+            Number of worker processes, None or 1 to search in this process
+        split_size : int
+            Bytes per range searched by a worker process
+        """
+        size = os.path.getsize(filename)
+        if size == 0:
+            return
+        if not processes or processes <= 1:
+            with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield from self.finditer(mm)
+            return
+
+        ranges = [(start, min(start + split_size, size)) for start in range(0, size, split_size)]
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(search_file_range, self.patterns, filename, start, end)
+                       for start, end in ranges]
+            for future in futures:
+                yield from future.result()
+
+
+def search_file_range(patterns, filename, start, end):
+    """Worker of MultiPatternSearch.search_file: list the occurrences starting in file[start:end]."""
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return list(MultiPatternSearch(patterns).finditer(mm, start, end))
+
+
 def update_pip():
     """
     Routine to update or share your pip installation configurations.
@@ -0,0 +1,224 @@
+"""
+Sampling profiler: a background thread periodically reads the stacks of all threads
+(sys._current_frames) and counts them in a trie, to see where a live program spends its time.
+
+Example
+-------
+    with SamplingProfiler(rate=100) as profiler:
+        run_service()
+    profiler.print_top(20)
+    profiler.write_collapsed('profile.folded')   # input of flamegraph.pl or speedscope
+
+Created by: Tony Held tony.held@gmail.com
+Created on: 2021-03-10
+Copyright © 2021 Tony Held.  All rights reserved.
+"""
+
+import os
+import sys
+import threading
+import time
+
+from tony_util.misc import stack_info
+
+
+class SamplingProfiler:
+    """Statistical profiler sampling the stacks of every thread rate times per second.
+
+    Each distinct function (code object) is interned as an integer id and the sampled stacks are
+    stored as paths of a trie of ids, so memory grows with the number of distinct stacks,
+    not with the number of samples.
+
+    The sampler thread needs the GIL to read the stacks, so with several CPU bound threads the actual
+    rate can be lower than rate (each thread may hold the GIL for sys.getswitchinterval() seconds).
+
+    Parameters
+    ----------
+    rate : float
+        Samples per second
+    threads : iterable of int
+        Thread idents to sample, all threads if None (the sampler thread is never sampled)
+    by_thread : bool
+        Start each stack with the thread name, so threads get separate flame graph towers
+    """
+
+    def __init__(self, rate=100, threads=None, by_thread=False):
+        self.interval = 1 / rate
+        self.threads = set(threads) if threads is not None else None
+        self.by_thread = by_thread
+        self.clear()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def clear(self):
+        """Discard the samples taken so far."""
+        # interned functions: code object -> id, and id -> display name
+        self.function_ids = {}
+        self.function_names = []
+        # trie of stacks, node 0 is the root: children {function id: node}, function id, self count
+        self.children = [{}]
+        self.node_function = [-1]
+        self.self_counts = [0]
+        self.n_samples = 0
+        self.sampling_time = 0.0
+        self.elapsed = 0.0
+
+    def function_id(self, key, name):
+        """Interned id of a function (or thread) key, named name in the reports."""
+        function_id = self.function_ids.get(key)
+        if function_id is None:
+            function_id = self.function_ids[key] = len(self.function_names)
+            self.function_names.append(name)
+        return function_id
+
+    def code_id(self, code):
+        """Interned id of a code object."""
+        function_id = self.function_ids.get(code)
+        if function_id is None:
+            name = f'{os.path.basename(code.co_filename)}:{getattr(code, "co_qualname", code.co_name)}'
+            function_id = self.function_id(code, name)
+        return function_id
+
+    def add_stack(self, function_ids):
+        """Count one sample of a stack given as function ids from the outermost call."""
+        node = 0
+        children, node_function = self.children, self.node_function
+        for function_id in function_ids:
+            child = children[node].get(function_id)
+            if child is None:
+                child = children[node][function_id] = len(node_function)
+                children.append({})
+                node_function.append(function_id)
+                self.self_counts.append(0)
+            node = child
+        self.self_counts[node] += 1
+
+    def sample(self):
+        """Record the current stack of every sampled thread."""
+        t0 = time.perf_counter()
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()} if self.by_thread else None
+        code_id = self.code_id
+        for ident, frame in sys._current_frames().items():
+            if ident == own or (self.threads is not None and ident not in self.threads):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(code_id(frame.f_code))
+                frame = frame.f_back
+            if names is not None:
+                stack.append(self.function_id(('thread', ident), f'thread {names.get(ident, ident)}'))
+            stack.reverse()
+            self.add_stack(stack)
+        self.n_samples += 1
+        self.sampling_time += time.perf_counter() - t0
+
+    def _run(self):
+        t0 = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            self.sample()
+        self.elapsed += time.perf_counter() - t0
+
+    def start(self):
+        """Start sampling on a daemon thread."""
+        if self._thread is not None:
+            raise RuntimeError('SamplingProfiler already started')
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='SamplingProfiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling, the samples are kept until clear is called."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def overhead(self):
+        """Fraction of the profiled wall time spent taking samples (on one core)."""
+        return self.sampling_time / self.elapsed if self.elapsed else 0.0
+
+    def stacks(self):
+        """Yield (list of function names from the outermost call, count) of each sampled stack."""
+        names = self.function_names
+        # iterative depth first walk of the trie, path holds the function ids of the current node
+        pending = [(child, 1) for child in reversed(self.children[0].values())]
+        path = []
+        while pending:
+            node, depth = pending.pop()
+            del path[depth - 1:]
+            path.append(self.node_function[node])
+            if self.self_counts[node]:
+                yield [names[i] for i in path], self.self_counts[node]
+            pending.extend((child, depth + 1) for child in reversed(self.children[node].values()))
+
+    def collapsed(self):
+        """Stacks in the collapsed (folded) format of flamegraph.pl: 'outer;inner;leaf count' per line."""
+        return ''.join(f'{";".join(stack)} {count}\n' for stack, count in self.stacks())
+
+    def write_collapsed(self, file_name):
+        """Save collapsed to a file."""
+        with open(file_name, 'w') as f:
+            f.write(self.collapsed())
+
+    def top(self, n=20, by='self'):
+        """Functions with the most samples.
+
+        Parameters
+        ----------
+        n : int
+            Number of functions returned
+        by : 'self' | 'cumulative'
+            Rank by the samples in the function itself or in the function and everything it called
+
+        Returns
+        -------
+        [(name, self samples, cumulative samples)]
+        """
+        self_counts, cumulative = {}, {}
+        for stack, count in self.stacks():
+            self_counts[stack[-1]] = self_counts.get(stack[-1], 0) + count
+            # recursive functions are counted once per sample
+            for name in set(stack):
+                cumulative[name] = cumulative.get(name, 0) + count
+        rows = [(name, self_counts.get(name, 0), cumulative[name]) for name in cumulative]
+        rows.sort(key=lambda row: row[1] if by == 'self' else row[2], reverse=True)
+        return rows[:n]
+
+    def print_top(self, n=20, by='self'):
+        """Print top with the percentages of all samples."""
+        total = sum(self.self_counts) or 1
+        print(f'{self.n_samples} samples in {self.elapsed:.2f} s, sampling overhead {self.overhead:.2%}')
+        print(f'{"self":>8s} {"cumulative":>10s}  function')
+        for name, self_count, cumulative in self.top(n, by):
+            print(f'{self_count / total:8.1%} {cumulative / total:10.1%}  {name}')
+
+    def thread_stack(self, ident, stack_print=True):
+        """Full detail (files, line numbers, statements) of the current stack of one thread,
+        see misc.stack_info."""
+        frame = sys._current_frames().get(ident)
+        if frame is None:
+            raise KeyError(f'No thread with ident {ident}')
+        return stack_info(stack_print, frame=frame)
+
+
+if __name__ == '__main__':
+    def fib(n):
+        return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+    def busy():
+        sum(i * i for i in range(3000000))
+
+    with SamplingProfiler(rate=100) as profiler:
+        fib(25)
+        busy()
+    profiler.print_top(10, by='cumulative')
+    print(profiler.collapsed()[:500])
@@ -0,0 +1,68 @@
+"""
+Benchmarks of the html rendering in tony_util.dir_diagnostics.
+
+Created by: Tony Held tony.held@gmail.com
+Created on: 2021-03-10
+Copyright © 2021 Tony Held.  All rights reserved.
+"""
+
+import threading
+import time
+import urllib.request
+from wsgiref.simple_server import make_server
+
+from tony_util.dir_diagnostics import values, iter_html, make_wsgi_app, ThreadingWSGIServer
+
+
+def make_large_object(n_attributes=2000, n_slow=20, delay=0.01):
+    """Object with n_attributes plain attributes and n_slow properties that take delay seconds each."""
+    attributes = {f'slow_{i:03d}': property(lambda self, i=i: time.sleep(delay) or f'<slow value {i}>')
+                  for i in range(n_slow)}
+    obj = type('LargeObject', (), attributes)()
+    for i in range(n_attributes):
+        setattr(obj, f'attr_{i:05d}', {'index': i, 'text': '<tag> & ' * 10})
+    return obj
+
+
+def bench_time_to_first_byte(n_attributes=2000, n_slow=20, delay=0.01):
+    """Compare the time until the first html is available when the whole report is built
+    with values(mode='html'), when iter_html is consumed directly, and when it is served over http.
+
+    Parameters
+    ----------
+    n_attributes : int
+        Plain attributes of the test object
+    n_slow : int
+        Properties of the test object that sleep for delay seconds
+    delay : float
+        Seconds taken by each slow property
+    """
+    obj = make_large_object(n_attributes, n_slow, delay)
+    print(f'\nTime to first byte, {n_attributes} attributes + {n_slow} properties of {delay} s')
+
+    t0 = time.perf_counter()
+    values(obj, mode='html', print_=False)
+    print(f'{"values(mode=html)":30s} first byte {time.perf_counter() - t0:8.4f} s')
+
+    t0 = time.perf_counter()
+    chunks = iter_html(obj)
+    next(chunks)
+    next(chunks)
+    first = time.perf_counter() - t0
+    for _ in chunks:
+        pass
+    print(f'{"iter_html":30s} first byte {first:8.4f} s   total {time.perf_counter() - t0:8.4f} s')
+
+    with make_server('127.0.0.1', 0, make_wsgi_app(obj), server_class=ThreadingWSGIServer) as server:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        t0 = time.perf_counter()
+        with urllib.request.urlopen(f'http://127.0.0.1:{server.server_port}/') as response:
+            response.read(1)
+            first = time.perf_counter() - t0
+            response.read()
+        print(f'{"wsgi server":30s} first byte {first:8.4f} s   total {time.perf_counter() - t0:8.4f} s')
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    bench_time_to_first_byte()
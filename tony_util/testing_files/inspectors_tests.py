@@ -0,0 +1,64 @@
+"""
+Regression tests of tony_util.inspectors.
+
+Each test raises an AssertionError on failure and prints a summary on success.
+
+Created by: Tony Held tony.held@gmail.com
+Created on: 2021-03-10
+Copyright © 2021 Tony Held.  All rights reserved.
+"""
+
+from tony_util.inspectors import Inspector, MemoryGraph
+
+
+class Node:
+    def __init__(self, data, next_node=None):
+        self.data = data
+        self.next = next_node
+
+
+def test_memory_graph_linked_list(n_nodes=10000):
+    """Nodes of a linked list that are also held in a list are reported under one short path pattern,
+    the shortest path from the root, not the chain of .next links."""
+    nodes = [Node(bytearray(100)) for _ in range(n_nodes)]
+    for node, next_node in zip(nodes, nodes[1:]):
+        node.next = next_node   # a depth first walk reaches nodes[1:] through nodes[0].next.next...
+    graph = MemoryGraph({'cache': nodes})
+    report = graph.report(top_n=10)
+
+    patterns = {row['path']: row['count'] for row in report['by_path']}
+    assert patterns.get("root[*][*]") == n_nodes, patterns
+    assert patterns.get("root[*][*].data") == n_nodes, patterns
+    longest = max(len(row['path']) for row in report['top_retainers'])
+    assert longest < 40, f'Top retainer path of {longest} characters'
+    # the list retains every node and its data
+    cache = next(row for row in report['top_retainers'] if row['path'] == "root['cache']")
+    assert cache['retained'] >= n_nodes * 100, cache
+    print(f'test_memory_graph_linked_list passed: {len(report["by_path"])} patterns for {graph.retained[0]} bytes')
+
+
+class HidingMeta(type):
+    def __dir__(cls):
+        return ['hidden']
+
+
+class WithMeta(metaclass=HidingMeta):
+    attribute = 1
+
+    def method(self):
+        pass
+
+
+def test_cached_dir_matches_dir():
+    """Inspector.cached_dir returns dir(obj), also for instances of a class whose metaclass defines __dir__."""
+    inspector = Inspector()
+    obj = WithMeta()
+    obj.value = 2
+    for target in (obj, WithMeta(), Node(1), WithMeta, 'text'):
+        assert inspector.cached_dir(target) == dir(target), f'cached_dir differs from dir for {target!r}'
+    print('test_cached_dir_matches_dir passed')
+
+
+if __name__ == '__main__':
+    test_memory_graph_linked_list()
+    test_cached_dir_matches_dir()
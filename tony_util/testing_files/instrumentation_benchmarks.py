@@ -0,0 +1,72 @@
+"""
+Per-call overhead of tony_util.instrumentation.timed, registered as the instrumentation suite
+of tony_util.benchmark, compared with logging every duration.
+
+Created by: Tony Held tony.held@gmail.com
+Created on: 2021-03-10
+Copyright © 2021 Tony Held.  All rights reserved.
+"""
+
+import logging
+import tempfile
+import time
+
+from tony_util.benchmark import benchmark, run_suite
+from tony_util.instrumentation import timed
+from tony_util.log_util import SingletonLogger
+
+n_calls = [100000]
+
+
+def work():
+    pass
+
+
+@timed('bench.decorated')
+def timed_work():
+    pass
+
+
+@benchmark('instrumentation', name='no timing', n=n_calls)
+def bench_plain(n):
+    for _ in range(n):
+        work()
+
+
+@benchmark('instrumentation', name='@timed', n=n_calls)
+def bench_decorator(n):
+    for _ in range(n):
+        timed_work()
+
+
+@benchmark('instrumentation', name='with timed()', n=n_calls)
+def bench_context(n):
+    for _ in range(n):
+        with timed('bench.context'):
+            work()
+
+
+log = None
+
+
+@benchmark('instrumentation', name='log every duration', n=n_calls)
+def bench_log_each(n):
+    """The pattern timed replaces: perf_counter around the call and a DEBUG record per call."""
+    global log
+    if log is None:
+        log = SingletonLogger.get_logger('bench_timing', path=tempfile.mkdtemp(), stdout_level=logging.INFO,
+                                         buffered=True)
+    for _ in range(n):
+        t0 = time.perf_counter()
+        work()
+        log.debug('work took %.6f s', time.perf_counter() - t0)
+
+
+if __name__ == '__main__':
+    results = run_suite('instrumentation', repeat=5)
+    baseline = results[0]['median']
+    print(f'\nPer-call cost, {n_calls[0]} calls')
+    for r in results:
+        n = r['params']['n']
+        print(f'{r["benchmark"]:25s} {r["median"] / n * 1e9:8.1f} ns/call   '
+              f'overhead {(r["median"] - baseline) / n * 1e9:8.1f} ns/call')
@@ -0,0 +1,247 @@
+"""
+Benchmarks of the logging options available in tony_util.log_util.SingletonLogger.
+
+Log files are written to a temporary directory so the logs folder is not polluted.
+
+Created by: Tony Held tony.held@gmail.com
+Created on: 2021-03-10
+Copyright © 2021 Tony Held.  All rights reserved.
+"""
+
+import logging
+import statistics
+import tempfile
+import threading
+import time
+import timeit
+
+from tony_util.log_util import SingletonLogger
+
+
+def _latency_summary(label, latencies):
+    """Print median, p99, and max of a list of per-call latencies (ns)."""
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f'{label:30s} median={statistics.median(latencies):10.0f} ns   '
+          f'p99={p99:10.0f} ns   max={latencies[-1]:10.0f} ns')
+
+
+def bench_queue_latency(n_threads=8, n_records=20000, path=None):
+    """Compare per-call latency of log.debug for the direct and queue=True loggers
+    while n_threads producer threads log concurrently.
+
+    Parameters
+    ----------
+    n_threads : int
+        Number of producer threads
+    n_records : int
+        Records logged by each producer thread
+    path : str
+        Directory for the log files, a temporary directory is used if None
+    """
+    path = path or tempfile.mkdtemp()
+    print(f'\nPer-call latency, {n_threads} threads x {n_records} records, log files in {path}')
+
+    configurations = [('direct handlers', dict()),
+                      ('queue, block', dict(queue=True, overflow='block')),
+                      ('queue, drop_oldest', dict(queue=True, overflow='drop_oldest')),
+                      ('queue, drop', dict(queue=True, overflow='drop')),
+                      ]
+
+    for label, kwargs in configurations:
+        name = 'bench_' + label.replace(', ', '_').replace(' ', '_')
+        log = SingletonLogger.get_logger(name, path=path, stdout_level=logging.INFO, **kwargs)
+        per_thread = [[] for _ in range(n_threads)]
+
+        def produce(latencies):
+            clock = time.perf_counter_ns
+            for i in range(n_records):
+                t0 = clock()
+                log.debug('record %d from %s', i, threading.current_thread().name)
+                latencies.append(clock() - t0)
+
+        threads = [threading.Thread(target=produce, args=(lat,)) for lat in per_thread]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+
+        _latency_summary(label, [x for lat in per_thread for x in lat])
+        print(f'{"":30s} wall time for all producers = {elapsed:.3f} s')
+
+    SingletonLogger.shutdown()
+
+
+def bench_file_throughput(n_records=200000, path=None):
+    """Compare records/second written to a DEBUG level log file
+    by the default FileHandler and the BufferedFileHandler.
+
+    Parameters
+    ----------
+    n_records : int
+        Records logged with each handler
+    path : str
+        Directory for the log files, a temporary directory is used if None
+    """
+    path = path or tempfile.mkdtemp()
+    print(f'\nFile throughput, {n_records} DEBUG records, log files in {path}')
+
+    configurations = [('FileHandler', dict()),
+                      ('BufferedFileHandler', dict(buffered=True)),
+                      ]
+
+    for label, kwargs in configurations:
+        log = SingletonLogger.get_logger(f'bench_{label}', path=path, stdout_level=logging.INFO, **kwargs)
+        t0 = time.perf_counter()
+        for i in range(n_records):
+            log.debug('record %d of the hot loop', i)
+        for handler in log.handlers:
+            handler.flush()
+        elapsed = time.perf_counter() - t0
+        print(f'{label:30s} {n_records / elapsed:12,.0f} records/s')
+
+
+def bench_disabled_calls(n_calls=1000000, path=None):
+    """Cost per log.debug call when no handler emits DEBUG records,
+    for the plain logging.Logger and the LazyLogger wrapper.
+
+    SingletonLogger sets the logger level to DEBUG, so a plain Logger builds a LogRecord
+    for every debug call and lets the handlers discard it.
+
+    Parameters
+    ----------
+    n_calls : int
+        Number of calls timed per case
+    path : str
+        Directory for the log files, a temporary directory is used if None
+    """
+    path = path or tempfile.mkdtemp()
+    print(f'\nCost per disabled debug call, {n_calls} calls')
+
+    lazy = SingletonLogger.get_lazy_logger('bench_disabled', path=path,
+                                           stdout_level=logging.INFO, file_level=logging.INFO)
+    plain = lazy.logger
+    data = list(range(100))
+
+    cases = [('Logger, f-string', lambda: plain.debug(f'data = {data}')),
+             ('Logger, format args', lambda: plain.debug('data = %s', data)),
+             ('LazyLogger, f-string', lambda: lazy.debug(f'data = {data}')),
+             ('LazyLogger, format args', lambda: lazy.debug('data = %s', data)),
+             ('LazyLogger, callable', lambda: lazy.debug(lambda: f'data = {data}')),
+             ]
+    baseline = min(timeit.repeat(lambda: None, number=n_calls, repeat=3))
+    for label, call in cases:
+        elapsed = min(timeit.repeat(call, number=n_calls, repeat=3)) - baseline
+        print(f'{label:30s} {elapsed / n_calls * 1e9:8.1f} ns/call')
+
+
+def bench_jsonl_throughput(n_records=200000, path=None):
+    """Compare records/second written to the log file in the text and jsonl formats.
+
+    Parameters
+    ----------
+    n_records : int
+        Records logged in each format
+    path : str
+        Directory for the log files, a temporary directory is used if None
+    """
+    path = path or tempfile.mkdtemp()
+    print(f'\nText vs JSON lines, {n_records} DEBUG records, log files in {path}')
+
+    for file_format in ('text', 'jsonl'):
+        log = SingletonLogger.get_logger(f'bench_format_{file_format}', path=path,
+                                         stdout_level=logging.INFO, buffered=True, format=file_format)
+        for label, extra in (('', None), (' + extra', {'request_id': 'abc123', 'elapsed': 0.25})):
+            t0 = time.perf_counter()
+            for i in range(n_records):
+                log.debug('record %d of the hot loop', i, extra=extra)
+            for handler in log.handlers:
+                handler.flush()
+            elapsed = time.perf_counter() - t0
+            print(f'{file_format + label:30s} {n_records / elapsed:12,.0f} records/s')
+
+
+def bench_ring_buffer(n_records=200000, error_every=50000, path=None):
+    """Compare records/second of always-on DEBUG file logging and of a ring buffer that
+    keeps DEBUG records in memory and writes them only when an ERROR is logged.
+
+    Parameters
+    ----------
+    n_records : int
+        DEBUG records logged with each configuration
+    error_every : int
+        An ERROR record is logged every error_every records
+    path : str
+        Directory for the log files, a temporary directory is used if None
+    """
+    path = path or tempfile.mkdtemp()
+    print(f'\nRing buffer, {n_records} DEBUG records with an ERROR every {error_every}, log files in {path}')
+
+    configurations = [('DEBUG file', dict()),
+                      ('ring buffer 1000', dict(ring_buffer=1000)),
+                      ]
+
+    for label, kwargs in configurations:
+        log = SingletonLogger.get_logger(f'bench_ring_{label.replace(" ", "_")}', path=path,
+                                         stdout_level=logging.CRITICAL, **kwargs)
+        # keep the ERROR records out of stderr
+        log.handlers[1].setLevel(logging.CRITICAL + 1)
+        t0 = time.perf_counter()
+        for i in range(1, n_records + 1):
+            log.debug('record %d of the hot loop', i)
+            if i % error_every == 0:
+                log.error('error after record %d', i)
+        for handler in log.handlers:
+            handler.flush()
+        elapsed = time.perf_counter() - t0
+        print(f'{label:30s} {n_records / elapsed:12,.0f} records/s')
+
+
+def bench_stats_overhead(n_records=100000, repeat=7, path=None):
+    """Compare records/second of buffered file logging with and without the stats counters
+    (track_stats), for records that are written and records that no handler emits.
+    The two loggers are timed alternately so drifts of the machine speed affect both.
+
+    Parameters
+    ----------
+    n_records : int
+        Records logged per timed run
+    repeat : int
+        Timed runs per case, the best is reported
+    path : str
+        Directory for the log files, a temporary directory is used if None
+    """
+    path = path or tempfile.mkdtemp()
+    print(f'\nStats counters overhead, {n_records} records, log files in {path}')
+
+    loggers = {}
+    for track_stats in (False, True):
+        log = loggers[track_stats] = SingletonLogger.get_logger(
+            f'bench_stats_{track_stats}', path=path, stdout_level=logging.INFO, file_level=logging.INFO,
+            buffered=True, track_stats=track_stats)
+        # keep the INFO records out of stdout, the stats still count them
+        log.handlers[2].setLevel(logging.CRITICAL + 1)
+
+    for label, level in (('written', logging.INFO), ('no handler emits', logging.DEBUG)):
+        elapsed = {False: [], True: []}
+        for _ in range(repeat):
+            for track_stats, log in loggers.items():
+                t0 = time.perf_counter()
+                for i in range(n_records):
+                    log.log(level, 'record %d of the hot loop', i)
+                for handler in log.handlers:
+                    handler.flush()
+                elapsed[track_stats].append(time.perf_counter() - t0)
+        best = {track_stats: min(times) for track_stats, times in elapsed.items()}
+        print(f'{label:20s} {n_records / best[False]:12,.0f} records/s without stats '
+              f'{n_records / best[True]:12,.0f} records/s with stats   overhead {best[True] / best[False] - 1:6.1%}')
+
+if __name__ == '__main__':
+    bench_queue_latency()
+    bench_file_throughput()
+    bench_disabled_calls()
+    bench_jsonl_throughput()
+    bench_ring_buffer()
+    bench_stats_overhead()
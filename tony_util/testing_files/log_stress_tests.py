@@ -0,0 +1,358 @@
+"""
+Stress tests of tony_util.log_util.SingletonLogger under concurrent writers.
+
+Each test raises an AssertionError on failure and prints a summary on success.
+Log files are written to a temporary directory so the logs folder is not polluted.
+
+Created by: Tony Held tony.held@gmail.com
+Created on: 2021-03-10
+Copyright © 2021 Tony Held.  All rights reserved.
+"""
+
+import glob
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from tony_util.log_util import SingletonLogger, BufferedFileHandler, DuplicateFilter, LogCollector
+
+
+def read_log_lines(file_name):
+    """Read all lines of the log file and its rotated (optionally gzip compressed) segments."""
+    lines = []
+    for fn in glob.glob(f'{file_name}*'):
+        opener = gzip.open if fn.endswith('.gz') else open
+        with opener(fn, 'rt') as f:
+            lines.extend(f.read().splitlines())
+    return lines
+
+
+def test_rotation_concurrent_writers(n_threads=8, n_records=5000, compress='gzip', path=None):
+    """Rotate a small log file while n_threads threads write to it
+    and check that every record appears exactly once across all segments.
+
+    Parameters
+    ----------
+    n_threads : int
+        Number of writer threads
+    n_records : int
+        Records written by each thread
+    compress : None | 'gzip'
+        Compression of the rotated segments
+    path : str
+        Directory for the log files, a temporary directory is used if None
+    """
+    path = path or tempfile.mkdtemp()
+    name = f'rotation_{compress}'
+    # backup_count is large enough that no segment is deleted during the test
+    log = SingletonLogger.get_logger(name, path=path, stdout_level=logging.INFO,
+                                     rotate_bytes=20000, backup_count=100000, compress=compress)
+
+    def write(thread_index):
+        for i in range(n_records):
+            log.debug('thread=%d record=%d', thread_index, i)
+
+    threads = [threading.Thread(target=write, args=(t,)) for t in range(n_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for handler in log.handlers:
+        handler.close()
+
+    file_name = os.path.join(path, f'{name}.log')
+    lines = [line for line in read_log_lines(file_name) if line.startswith('thread=')]
+    counts = Counter(lines)
+    expected = {f'thread={t} record={i}' for t in range(n_threads) for i in range(n_records)}
+    assert set(counts) == expected, f'{len(expected - set(counts))} records lost'
+    duplicates = [line for line, n in counts.items() if n > 1]
+    assert not duplicates, f'{len(duplicates)} records duplicated'
+
+    segments = glob.glob(f'{file_name}.*')
+    assert not [fn for fn in segments if fn.endswith(('.rotating', '.tmp'))], 'Unfinished compression'
+    print(f'test_rotation_concurrent_writers(compress={compress!r}) passed: '
+          f'{len(lines)} records in {len(segments)} rotated segments')
+
+
+def _multiprocess_worker(path, process_index, n_records, payload):
+    """Log n_records long records from a worker process (see test_multiprocess_no_torn_lines)."""
+    log = SingletonLogger.get_logger('multiprocess', path=path, stdout_level=logging.INFO, multiprocess=True)
+    for i in range(n_records):
+        log.debug('begin process=%d record=%d %s end', process_index, i, payload)
+
+
+def test_subprocess_ignores_collector(path=None):
+    """Start a Python subprocess (not a multiprocessing worker) while a collector runs, so it inherits
+    the collector environment variable but not the authkey, and check that its multiprocess=True logger
+    writes its own log file instead of failing to connect to the collector.
+
+    Parameters
+    ----------
+    path : str
+        Directory for the log files, a temporary directory is used if None
+    """
+    path = path or tempfile.mkdtemp()
+    SingletonLogger.get_logger('collector_env', path=path, stdout_level=logging.INFO, multiprocess=True)
+    assert os.environ.get(LogCollector.env_var), 'No collector running'
+    child_path = os.path.join(path, 'child')
+    code = ('import logging\n'
+            'from tony_util.log_util import SingletonLogger\n'
+            f'log = SingletonLogger.get_logger("child", path={child_path!r}, stdout_level=logging.CRITICAL + 1, '
+            'multiprocess=True)\n'
+            'log.debug("record from the subprocess")\n')
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0 and 'Logging error' not in result.stderr, result.stderr
+    with open(os.path.join(child_path, 'child.log')) as f:
+        assert 'record from the subprocess' in f.read(), 'The subprocess did not write its own log file'
+    print('test_subprocess_ignores_collector passed')
+
+
+def test_multiprocess_no_torn_lines(n_processes=4, n_records=2000, start_method='spawn', path=None):
+    """Log from n_processes worker processes to one multiprocess=True logger and check
+    that the log file has every record exactly once, with no torn or interleaved lines.
+
+    Parameters
+    ----------
+    n_processes : int
+        Number of worker processes
+    n_records : int
+        Records logged by each worker
+    start_method : 'spawn' | 'fork' | 'forkserver'
+        multiprocessing start method of the workers
+    path : str
+        Directory for the log files, a temporary directory is used if None
+    """
+    path = path or tempfile.mkdtemp()
+    payload = 'x' * 500  # long lines make torn writes easy to detect
+    log = SingletonLogger.get_logger('multiprocess', path=path, stdout_level=logging.INFO, multiprocess=True)
+    log.debug('parent process started')
+
+    context = multiprocessing.get_context(start_method)
+    processes = [context.Process(target=_multiprocess_worker, args=(path, p, n_records, payload))
+                 for p in range(n_processes)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+        assert p.exitcode == 0, f'Worker exit code {p.exitcode}'
+    SingletonLogger.shutdown()
+    for handler in log.handlers:
+        handler.flush()
+
+    with open(os.path.join(path, 'multiprocess.log')) as f:
+        lines = f.read().splitlines()
+    pattern = re.compile(rf'begin process=(\d+) record=(\d+) {payload} end')
+    records = [line for line in lines if line.startswith('begin')]
+    torn = [line for line in records if not pattern.fullmatch(line)]
+    torn += [line for line in lines if not line.startswith(('begin', 'Logger created at', 'parent process'))]
+    assert not torn, f'{len(torn)} torn lines, first: {torn[0][:100]!r}'
+    counts = Counter(records)
+    expected = {f'begin process={p} record={i} {payload} end' for p in range(n_processes) for i in range(n_records)}
+    assert set(counts) == expected, f'{len(expected - set(counts))} records lost'
+    assert max(counts.values()) == 1, 'Records duplicated'
+    print(f'test_multiprocess_no_torn_lines(start_method={start_method!r}) passed: '
+          f'{len(records)} records from {n_processes} processes')
+
+
+def test_duplicate_filter(timeout=0.2, path=None):
+    """Log runs of a constant message through a collapse_duplicates=True logger and check that
+    each run is written once followed by its repeat count, which is logged ahead of the next different
+    message, after timeout seconds, and at shutdown.  The summaries must not carry internal attributes.
+
+    Parameters
+    ----------
+    timeout : float
+        duplicate_timeout of the logger
+    path : str
+        Directory for the log files, a temporary directory is used if None
+    """
+    path = path or tempfile.mkdtemp()
+    log = SingletonLogger.get_logger('duplicates', path=path, stdout_level=logging.CRITICAL + 1,
+                                     collapse_duplicates=True, duplicate_timeout=timeout, format='jsonl')
+    # keep the WARNING records out of stderr
+    log.handlers[1].setLevel(logging.CRITICAL + 1)
+
+    for _ in range(5):
+        log.warning('dependency down')
+    log.info('other %s', 1)
+    for _ in range(3):
+        log.warning('dependency down')
+    time.sleep(timeout * 3)
+    for _ in range(2):
+        log.warning('dependency down')
+    SingletonLogger.shutdown()
+    for handler in log.handlers:
+        handler.flush()
+
+    with open(os.path.join(path, 'duplicates.log')) as f:
+        records = [json.loads(line) for line in f][1:]  # skip 'Logger created at'
+    expected = ['dependency down', 'Last message repeated 4 times', 'other 1',
+                'dependency down', 'Last message repeated 2 times',   # after the timeout
+                'Last message repeated 2 times']                     # at shutdown
+    messages = [r['message'] for r in records]
+    assert messages == expected, f'{messages} != {expected}'
+    leaked = [r for r in records if set(r) - {'timestamp', 'level', 'logger', 'module', 'line', 'message'}]
+    assert not leaked, f'Unexpected fields: {leaked[0]}'
+    print(f'test_duplicate_filter passed: {len(records)} records')
+
+
+def test_buffered_idle_flush(flush_interval=0.2, path=None):
+    """Log one record to a buffered=True logger and check that the flusher thread writes it
+    within 2 * flush_interval seconds although no other record arrives.
+
+    Parameters
+    ----------
+    flush_interval : float
+        flush_interval of the logger
+    path : str
+        Directory for the log files, a temporary directory is used if None
+    """
+    path = path or tempfile.mkdtemp()
+    log = SingletonLogger.get_logger('idle_flush', path=path, stdout_level=logging.CRITICAL + 1,
+                                     buffered=True, flush_interval=flush_interval)
+    file_name = os.path.join(path, 'idle_flush.log')
+    time.sleep(flush_interval * 2)
+    log.debug('idle record')
+    time.sleep(flush_interval * 2)
+    with open(file_name) as f:
+        lines = f.readlines()
+    assert lines and lines[-1].rstrip().endswith('idle record'), f'Buffer not written: {lines}'
+    print(f'test_buffered_idle_flush passed: written within {flush_interval * 2} s')
+
+
+def test_buffered_close_while_flushing(n_handlers=200, flush_interval=0.002, path=None):
+    """Close buffered handlers while holding their lock, as logging.shutdown does,
+    at the moment their flusher threads wake up, and check that no close deadlocks
+    and that every record is written.
+
+    Parameters
+    ----------
+    n_handlers : int
+        Handlers created and closed
+    flush_interval : float
+        flush_interval of the handlers, short so the flusher wakes up during close
+    path : str
+        Directory for the log files, a temporary directory is used if None
+    """
+    path = path or tempfile.mkdtemp()
+    for i in range(n_handlers):
+        file_name = os.path.join(path, f'close_{i}.log')
+        handler = BufferedFileHandler(file_name, flush_interval=flush_interval)
+        handler.handle(logging.makeLogRecord({'msg': f'record {i}', 'levelno': logging.INFO, 'levelname': 'INFO'}))
+
+        def close():
+            handler.acquire()
+            try:
+                time.sleep(flush_interval * (i % 3))  # let the flusher wake up and try the lock
+                handler.close()
+            finally:
+                handler.release()
+
+        closer = threading.Thread(target=close, daemon=True)
+        closer.start()
+        closer.join(5.0)
+        if closer.is_alive():
+            raise AssertionError(f'close deadlocked with the flusher thread of handler {i}')
+        with open(file_name) as f:
+            assert f.read() == f'record {i}\n', f'Record of handler {i} not written'
+    print(f'test_buffered_close_while_flushing passed: {n_handlers} handlers closed')
+
+
+def test_ring_buffer_mutable_args(path=None):
+    """Log DEBUG records with a mutable argument through a ring_buffer logger, change the argument,
+    then log an ERROR, and check that the dumped records show the values at the time of each call.
+
+    Parameters
+    ----------
+    path : str
+        Directory for the log files, a temporary directory is used if None
+    """
+    path = path or tempfile.mkdtemp()
+    log = SingletonLogger.get_logger('ring_args', path=path, stdout_level=logging.CRITICAL + 1, ring_buffer=100)
+    log.handlers[1].setLevel(logging.CRITICAL + 1)  # keep the ERROR out of stderr
+    state = []
+    for i in range(3):
+        state.append(i)
+        log.debug('state %s step %d', state, i)
+    log.error('failed')
+    for handler in log.handlers:
+        handler.flush()
+
+    with open(os.path.join(path, 'ring_args.log')) as f:
+        messages = [line.rstrip('\n').split(' - ')[-1] for line in f]
+    expected = ['state [0] step 0', 'state [0, 1] step 1', 'state [0, 1, 2] step 2', 'failed']
+    assert messages[-4:] == expected, f'{messages[-4:]} != {expected}'
+    print('test_ring_buffer_mutable_args passed')
+
+
+class ListHandler(logging.Handler):
+    """Keep the messages of the handled records."""
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_filter_summaries_evicted(path=None):
+    """Check that the counts suppressed by rate limit and duplicate filters are logged when their
+    LRU entry is evicted, and that rate limit counts are also logged at shutdown.
+
+    Parameters
+    ----------
+    path : str
+        Directory for the log files, a temporary directory is used if None
+    """
+    path = path or tempfile.mkdtemp()
+    log = SingletonLogger.get_logger('rate_evict', path=path, stdout_level=logging.CRITICAL + 1,
+                                     rate_limit=0.001, rate_burst=1, max_templates=1)
+    log.handlers[1].setLevel(logging.CRITICAL + 1)  # keep the WARNING records out of stderr
+    for i in range(3):
+        log.warning('a %d', i)
+    log.warning('b')    # evicts the 'a %d' template
+    log.warning('b')
+    SingletonLogger.shutdown()
+    for handler in log.handlers:
+        handler.flush()
+    with open(os.path.join(path, 'rate_evict.log')) as f:
+        messages = [line.rstrip('\n') for line in f][1:]  # skip 'Logger created at'
+    expected = ['a 0', '2 similar messages suppressed by rate limit', 'b',
+                '1 similar messages suppressed by rate limit']  # at shutdown
+    assert messages == expected, f'{messages} != {expected}'
+
+    # one DuplicateFilter shared by two loggers, so the second one evicts the first
+    duplicates = DuplicateFilter(max_templates=1, timeout=None)
+    handler = ListHandler()
+    for name in ('evict_a', 'evict_b'):
+        logger = logging.getLogger(name)
+        logger.propagate = False
+        logger.addFilter(duplicates)
+        logger.addHandler(handler)
+    for _ in range(3):
+        logging.getLogger('evict_a').warning('same')
+    logging.getLogger('evict_b').warning('other')
+    expected = ['same', 'Last message repeated 2 times', 'other']
+    assert handler.messages == expected, f'{handler.messages} != {expected}'
+    print('test_filter_summaries_evicted passed')
+
+
+if __name__ == '__main__':
+    test_rotation_concurrent_writers(compress=None)
+    test_rotation_concurrent_writers(compress='gzip')
+    test_multiprocess_no_torn_lines(start_method='spawn')
+    test_subprocess_ignores_collector()
+    test_duplicate_filter()
+    test_buffered_idle_flush()
+    test_buffered_close_while_flushing()
+    test_ring_buffer_mutable_args()
+    test_filter_summaries_evicted()
@@ -0,0 +1,156 @@
+"""
+Benchmarks of the stack introspection utilities in tony_util.misc.
+
+Created by: Tony Held tony.held@gmail.com
+Created on: 2021-03-10
+Copyright © 2021 Tony Held.  All rights reserved.
+"""
+
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+import traceback
+import tracemalloc
+
+from tony_util.misc import my_calling_statement, print_all, findall, MultiPatternSearch, get_max_char, bounded_repr
+
+
+def extract_stack_statement(stack_index=-3):
+    """Previous implementation of my_calling_statement, kept for comparison."""
+    filename, linenum, function_name, statement = traceback.extract_stack()[stack_index]
+    return statement
+
+
+def at_depth(depth, func):
+    """Call func with depth extra frames on the stack."""
+    if depth <= 0:
+        return func()
+    return at_depth(depth - 1, func)
+
+
+def bench_calling_statement(depths=(10, 100, 500), n_calls=2000):
+    """Time my_calling_statement, the extract_stack implementation it replaced, and print_all
+    at several stack depths.
+
+    Parameters
+    ----------
+    depths : iterable of int
+        Stack depths to test
+    n_calls : int
+        Number of calls timed per case
+    """
+    a, b = 10, [1, 2, 3]
+    cases = [('stack setup only', lambda: None),
+             ('extract_stack', lambda: extract_stack_statement()),
+             ('my_calling_statement', lambda: my_calling_statement()),
+             ('print_all(a, b)', lambda: print_all(a, b)),
+             ]
+    print(f'\nCalling statement lookup, {n_calls} calls')
+    for depth in depths:
+        for label, call in cases:
+            with contextlib.redirect_stdout(io.StringIO()):
+                elapsed = min(timeit.repeat(lambda: at_depth(depth, call), number=n_calls, repeat=3))
+            print(f'depth={depth:<5d} {label:25s} {elapsed / n_calls * 1e6:10.2f} us/call')
+
+
+def bench_multi_pattern(n_patterns=24, n_lines=500000, processes=4):
+    """Compare repeated findall calls (one pass per pattern) with a single MultiPatternSearch pass
+    over a synthetic log, both in memory and as a memory mapped file.
+
+    Parameters
+    ----------
+    n_patterns : int
+        Number of tokens searched for
+    n_lines : int
+        Lines in the synthetic log
+    processes : int
+        Worker processes for the process pool file search
+    """
+    random.seed(0)
+    tokens = [f'TOKEN_{i:03d}' for i in range(n_patterns)]
+    words = ['INFO', 'DEBUG', 'request', 'handled', 'in', 'ms', 'user', 'session'] + tokens
+    # roughly one token per 100 words, as in a real log
+    weights = [99 / 8] * 8 + [1 / n_patterns] * n_patterns
+    text = '\n'.join(' '.join(random.choices(words, weights, k=8)) for _ in range(n_lines))
+    print(f'\nMulti-pattern search, {n_patterns} patterns, {len(text) / 1e6:.0f} MB of text')
+
+    t0 = time.perf_counter()
+    n_findall = sum(1 for p in tokens for _ in findall(p, text))
+    t1 = time.perf_counter()
+    print(f'{"findall per pattern (str)":35s} {t1 - t0:8.3f} s   {n_findall} hits')
+
+    mps = MultiPatternSearch(tokens)
+    t0 = time.perf_counter()
+    n_multi = sum(1 for _ in mps.finditer(text))
+    t1 = time.perf_counter()
+    print(f'{"MultiPatternSearch (str)":35s} {t1 - t0:8.3f} s   {n_multi} hits')
+
+    fd, filename = tempfile.mkstemp(suffix='.log')
+    with os.fdopen(fd, 'w') as f:
+        f.write(text)
+    try:
+        for label, kwargs in (('MultiPatternSearch (mmap)', dict()),
+                              (f'MultiPatternSearch ({processes} processes)',
+                               dict(processes=processes, split_size=len(text) // processes + 1))):
+            t0 = time.perf_counter()
+            n_file = sum(1 for _ in mps.search_file(filename, **kwargs))
+            t1 = time.perf_counter()
+            print(f'{label:35s} {t1 - t0:8.3f} s   {n_file} hits')
+    finally:
+        os.remove(filename)
+
+
+def bench_bounded_repr(max_char=100):
+    """Compare time and peak memory of str() followed by get_max_char with bounded_repr
+    for large objects.  numpy and pandas objects are skipped if those packages are not installed.
+
+    Parameters
+    ----------
+    max_char : int
+        Characters kept from each object
+    """
+    objects = [('list of 1e6 ints', list(range(1000000))),
+               ('dict of 1e5 items', {i: str(i) for i in range(100000)}),
+               ('str of 1e7 chars', 'x' * 10000000),
+               ]
+    try:
+        import numpy as np
+        objects.append(('ndarray 1e6 floats, no summary', np.random.rand(1000000)))
+    except ImportError:
+        np = None
+    try:
+        import pandas as pd
+        objects.append(('DataFrame 1e5 x 10', pd.DataFrame(np.random.rand(100000, 10))))
+    except ImportError:
+        pass
+
+    cases = [('str + get_max_char', lambda x: get_max_char(str(x), max_char)),
+             ('bounded_repr', lambda x: bounded_repr(x, max_char, output_mode='!s')),
+             ]
+    print(f'\nTruncated conversion to {max_char} characters')
+    for obj_label, obj in objects:
+        for label, convert in cases:
+            if np is not None and isinstance(obj, np.ndarray):
+                # the full repr is only built if numpy's summarization is turned off
+                context = np.printoptions(threshold=sys.maxsize)
+            else:
+                context = contextlib.nullcontext()
+            with context:
+                tracemalloc.start()
+                t0 = time.perf_counter()
+                convert(obj)
+                elapsed = time.perf_counter() - t0
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            print(f'{obj_label:32s} {label:20s} {elapsed * 1e3:10.3f} ms {peak / 1e6:10.3f} MB peak')
+
+
+if __name__ == '__main__':
+    bench_calling_statement()
+    bench_multi_pattern()
+    bench_bounded_repr()
@@ -0,0 +1,46 @@
+"""
+Regression tests of the repr helpers in tony_util.misc.
+
+Each test raises an AssertionError on failure and prints a summary on success.
+
+Created by: Tony Held tony.held@gmail.com
+Created on: 2021-03-10
+Copyright © 2021 Tony Held.  All rights reserved.
+"""
+
+from tony_util.misc import bounded_repr
+from tony_util import dir_diagnostics
+
+
+class Series:
+    """Not a pandas.Series, BoundedRepr must not call its (missing) to_string."""
+    def __init__(self, values):
+        self.values = values
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.values!r})'
+
+
+class DataFrame(Series):
+    pass
+
+
+class ndarray(Series):
+    pass
+
+
+def test_bounded_repr_foreign_names(max_char=50):
+    """bounded_repr and dir_diagnostics.values of objects whose class is named like a numpy
+    or pandas class without being one fall back to repr."""
+    for cls in (Series, DataFrame, ndarray):
+        obj = cls(list(range(100)))
+        text = bounded_repr(obj, max_char)
+        assert text.startswith(f'{cls.__name__}([0, 1, 2'), text
+        assert len(text) < max_char + 60, text
+        assert bounded_repr([obj], max_char).startswith(f'[{cls.__name__}('), bounded_repr([obj], max_char)
+        dir_diagnostics.values(obj, print_=False, max_char=max_char)
+    print('test_bounded_repr_foreign_names passed')
+
+
+if __name__ == '__main__':
+    test_bounded_repr_foreign_names()
@@ -1,18 +1,18 @@
 # module used to test import statements
 from tony_util.log_util import SingletonLogger
 
-log = SingletonLogger.get_logger('module_b')
+log = SingletonLogger.get_lazy_logger('module_b')
 
-log.debug(f'Module: {__name__}: Called with debug 10')
-log.info(f'Module: {__name__}: Called with info 20')
-log.warning(f'Module: {__name__}: Called with warning 30')
-log.error(f'Module: {__name__}: Called with error 40')
-log.critical(f'Module: {__name__}: Called with critical 50')
+log.debug('Module: %s: Called with debug 10', __name__)
+log.info('Module: %s: Called with info 20', __name__)
+log.warning('Module: %s: Called with warning 30', __name__)
+log.error('Module: %s: Called with error 40', __name__)
+log.critical('Module: %s: Called with critical 50', __name__)
 
 
-log2 = SingletonLogger.get_logger()
-log2.debug(f'Module: {__name__}: Called with debug 10b')
-log2.info(f'Module: {__name__}: Called with info 20b')
-log2.warning(f'Module: {__name__}: Called with warning 30b')
-log2.error(f'Module: {__name__}: Called with error 40b')
-log2.critical(f'Module: {__name__}: Called with critical 50b')
+log2 = SingletonLogger.get_lazy_logger()
+log2.debug('Module: %s: Called with debug 10b', __name__)
+log2.info('Module: %s: Called with info 20b', __name__)
+log2.warning('Module: %s: Called with warning 30b', __name__)
+log2.error('Module: %s: Called with error 40b', __name__)
+log2.critical('Module: %s: Called with critical 50b', __name__)
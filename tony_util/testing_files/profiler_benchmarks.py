@@ -0,0 +1,62 @@
+"""
+Overhead of the sampling profiler in tony_util.profiler.
+
+Created by: Tony Held tony.held@gmail.com
+Created on: 2021-03-10
+Copyright © 2021 Tony Held.  All rights reserved.
+"""
+
+import statistics
+import threading
+import time
+
+from tony_util.profiler import SamplingProfiler
+
+
+def workload(depth=30, n=2000000):
+    """Pure python work under a stack of depth frames, so stack walking has something to walk."""
+    if depth:
+        return workload(depth - 1, n)
+    total = 0
+    for i in range(n):
+        total += i * i % 7
+    return total
+
+
+def bench_overhead(rates=(100, 1000), n_threads=4, repeat=5):
+    """Compare the wall time of n_threads threads running workload with and without the profiler.
+
+    Parameters
+    ----------
+    rates : iterable of float
+        Sampling rates (Hz) tested
+    n_threads : int
+        Threads running the workload (all sampled)
+    repeat : int
+        Timed runs per case, the median is reported
+    """
+    def run():
+        threads = [threading.Thread(target=workload) for _ in range(n_threads)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - t0
+
+    print(f'\nSampling profiler overhead, {n_threads} threads')
+    baseline = statistics.median(run() for _ in range(repeat))
+    print(f'{"no profiler":20s} {baseline:8.4f} s')
+    for rate in rates:
+        times, profiler = [], None
+        for _ in range(repeat):
+            with SamplingProfiler(rate=rate) as profiler:
+                times.append(run())
+        elapsed = statistics.median(times)
+        print(f'{f"{rate} Hz":20s} {elapsed:8.4f} s   overhead {elapsed / baseline - 1:7.2%}   '
+              f'time in sampler {profiler.overhead:6.2%}   {profiler.n_samples} samples, '
+              f'{len(profiler.node_function)} trie nodes')
+
+
+if __name__ == '__main__':
+    bench_overhead()
@@ -1,18 +1,56 @@
 """
 Simple testing of computational advantages of numpy over standard python looping.
 
+The tests are registered as the numpy_vs_loops suite of tony_util.benchmark and swept over array_size.
+Run them with
+    python -m tony_util.timing_profiling --repeat 7 --param array_size=1e4,1e6 --json results.json
+Add --memory to also report peak memory, and the bytes and allocated blocks per element kept by the
+arrays each method builds (the tests return their arrays so that memory can be measured).
+
+The out_of_core suite compares test3 with test_chunked, which runs the same workload on memory mapped
+files in cache-sized blocks on a thread pool.  For sizes beyond RAM run the chunked version alone
+    python -m tony_util.timing_profiling --suite out_of_core --bench chunked --param array_size=1e10
+
+The scaling suite runs the loop (test2) and numpy (test3) kernels on slices of the arrays with thread
+and process pools of increasing size (processes share the arrays through multiprocessing.shared_memory)
+next to the single core vectorized test3, and prints speedup and efficiency per worker count
+    python -m tony_util.timing_profiling --suite scaling --param workers=1,2,4,8,16,32
+
 Created by: Tony Held tony.held@gmail.com
 Created on: 2020-10-08
 Copyright © 2020 Tony Held.  All rights reserved.
 """
 
-import time
+import os
 import random
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
 import numpy as np
+from tony_util.benchmark import benchmark, main
 
 array_size = 1000000
+array_sizes = [10000, 100000, array_size]
+out_of_core_sizes = [10 ** 6, 10 ** 7, 10 ** 8]
+
+scaling_size = 2 * 10 ** 6
+# powers of 2 up to the number of cores, and the number of cores
+scaling_workers = sorted({2 ** i for i in range(os.cpu_count().bit_length()) if 2 ** i <= os.cpu_count()}
+                         | {os.cpu_count()})
+
+# elements per block of the chunked workload, 3 float64 blocks + the mask fit in a 1 MB L2 cache
+block_size = 2 ** 15
+
 
-def test1():
+def workload_bytes(array_size, **params):
+    """Bytes of the a, b, and c float64 arrays written by the workload, for GB/s reporting."""
+    return 3 * 8 * array_size
+
+
+@benchmark('numpy_vs_loops', name='appending', elements='array_size', array_size=array_sizes)
+def test1(array_size=array_size):
     """Add two random arrays together with simple for loops without pre-allocating list size.
     """
     # initialize list with all 0’s
@@ -36,9 +74,11 @@ def test1():
             b[i] *= -1
         if c[i] < 0.5:
             c[i] *= -1
+    return a, b, c
 
 
-def test2():
+@benchmark('numpy_vs_loops', name='pre-allocated', elements='array_size', array_size=array_sizes)
+def test2(array_size=array_size):
     """Add two random arrays together with simple for loops with pre-allocation"""
 
     # pre allocate lists by initialize initial size and populating with with all 0’s
@@ -59,9 +99,13 @@ def test2():
             b[i] *= -1
         if c[i] < 0.5:
             c[i] *= -1
+    return a, b, c
 
 
-def test3():
+@benchmark('out_of_core', name='in-memory', elements='array_size', nbytes=workload_bytes,
+           array_size=out_of_core_sizes)
+@benchmark('numpy_vs_loops', name='vectorized', elements='array_size', array_size=array_sizes)
+def test3(array_size=array_size):
     """Add two random arrays together with numpy"""
     a = np.random.rand(array_size)
     b = np.random.rand(array_size)
@@ -69,28 +113,184 @@ def test3():
     a[a < 0.5] *= -1
     b[b < 0.5] *= -1
     c[c < 0.5] *= -1
+    return a, b, c
+
+
+def process_block(a, b, c, start, stop, seed, buffers):
+    """test3 on elements start:stop of a, b, and c, in place without temporaries.
+    buffers is a thread local holding the boolean mask reused by every block of a thread."""
+    mask = getattr(buffers, 'mask', None)
+    if mask is None or len(mask) < stop - start:
+        mask = buffers.mask = np.empty(block_size, dtype=bool)
+    mask = mask[:stop - start]
+
+    a_block, b_block, c_block = a[start:stop], b[start:stop], c[start:stop]
+    # each block has its own generator so the result doesn't depend on the thread scheduling
+    rng = np.random.default_rng([seed, start])
+    rng.random(out=a_block)
+    rng.random(out=b_block)
+    np.add(a_block, b_block, out=c_block)
+    for block in (a_block, b_block, c_block):
+        np.less(block, 0.5, out=mask)
+        np.negative(block, out=block, where=mask)
+
+
+@benchmark('out_of_core', name='chunked', elements='array_size', nbytes=workload_bytes,
+           array_size=out_of_core_sizes)
+def test_chunked(array_size=array_size, directory=None, workers=None, seed=0):
+    """test3 on np.memmap backed files, so the arrays can be larger than memory.
+
+    The arrays are processed in blocks of block_size elements with in-place ufuncs (out=),
+    spread over a thread pool (numpy releases the GIL inside ufuncs).
+
+    Parameters
+    ----------
+    array_size : int
+        Number of elements in each array
+    directory : str
+        Directory for the a, b, and c files (deleted afterwards), a temporary directory if None
+    workers : int
+        Threads of the pool, os.cpu_count() if None
+    seed : int
+        Seed of the random values
+    """
+    directory = tempfile.mkdtemp(dir=directory)
+    try:
+        a, b, c = (np.memmap(os.path.join(directory, f'{name}.dat'), dtype=np.float64, mode='w+',
+                             shape=(array_size,)) for name in 'abc')
+        buffers = threading.local()
+        with ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+            # consume the iterator so exceptions from the workers are raised here
+            list(pool.map(lambda start: process_block(a, b, c, start, min(start + block_size, array_size),
+                                                      seed, buffers),
+                          range(0, array_size, block_size)))
+        for array in (a, b, c):
+            array.flush()
+        del a, b, c
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def loop_kernel(a, b, c, start, stop, seed):
+    """test2 on elements start:stop of a, b, and c with python loops (holds the GIL)."""
+    rand = random.Random(seed + start).random
+    # element access through memoryviews is several times faster than through ndarrays
+    a, b, c = a.data, b.data, c.data
+    for i in range(start, stop):
+        x, y = rand(), rand()
+        z = x + y
+        a[i] = -x if x < 0.5 else x
+        b[i] = -y if y < 0.5 else y
+        c[i] = -z if z < 0.5 else z
+
+
+def numpy_kernel(a, b, c, start, stop, seed):
+    """test3 on elements start:stop of a, b, and c, in cache-sized blocks (see process_block)."""
+    buffers = threading.local()
+    for block_start in range(start, stop, block_size):
+        process_block(a, b, c, block_start, min(block_start + block_size, stop), seed, buffers)
+
+
+kernels = {'loop': loop_kernel, 'numpy': numpy_kernel}
+
+# workers -> ProcessPoolExecutor, kept between calls so the process start up isn't timed after the warmup
+process_pools = {}
+
+# shared memory name -> (SharedMemory, (a, b, c)) attached in a worker process
+attached = {}
+
+
+def shared_arrays(name, array_size):
+    """The a, b, and c arrays in the shared memory block name, attached once per worker process."""
+    if name not in attached:
+        # the parent unlinks each block after its call, release the previous one
+        for old_name in list(attached):
+            shm, arrays = attached.pop(old_name)
+            del arrays
+            shm.close()
+        shm = SharedMemory(name)
+        attached[name] = shm, tuple(np.ndarray((array_size,), np.float64, shm.buf, offset=i * 8 * array_size)
+                                    for i in range(3))
+    return attached[name][1]
+
+
+def run_shared_kernel(kernel, name, array_size, start, stop, seed):
+    """Run a kernel in a worker process on the arrays in shared memory, nothing is copied."""
+    kernels[kernel](*shared_arrays(name, array_size), start, stop, seed)
+
+
+def split(array_size, workers):
+    """(start, stop) of workers contiguous slices covering array_size elements."""
+    bounds = [array_size * i // workers for i in range(workers + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+@benchmark('scaling', name='threads', elements='array_size', nbytes=workload_bytes,
+           kernel=list(kernels), workers=scaling_workers, array_size=[scaling_size])
+def test_threads(kernel='numpy', workers=1, array_size=scaling_size, seed=0):
+    """Run a kernel on workers slices of the arrays with a thread pool."""
+    a, b, c = (np.empty(array_size) for _ in range(3))
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(lambda bounds: kernels[kernel](a, b, c, *bounds, seed), split(array_size, workers)))
+    return a, b, c
+
+
+@benchmark('scaling', name='processes', elements='array_size', nbytes=workload_bytes,
+           kernel=list(kernels), workers=scaling_workers, array_size=[scaling_size])
+def test_processes(kernel='numpy', workers=1, array_size=scaling_size, seed=0):
+    """Run a kernel on workers slices of the arrays with a process pool.
+    The arrays live in one shared memory block that every worker maps without copying.
+    Nothing is returned: the block is released at the end of the call and copying the arrays out
+    would be timed with the kernels."""
+    if workers not in process_pools:
+        process_pools[workers] = ProcessPoolExecutor(workers)
+    pool = process_pools[workers]
+    shm = SharedMemory(create=True, size=3 * 8 * array_size)
+    try:
+        futures = [pool.submit(run_shared_kernel, kernel, shm.name, array_size, start, stop, seed)
+                   for start, stop in split(array_size, workers)]
+        for future in futures:
+            future.result()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+@benchmark('scaling', name='vectorized', elements='array_size', nbytes=workload_bytes,
+           array_size=[scaling_size])
+def test_vectorized(array_size=scaling_size):
+    """test3 on a single core, the reference for the speedup of the parallel versions."""
+    return test3(array_size)
+
+
+def print_scaling(results):
+    """Print speedup and efficiency of the scaling suite results for each worker count.
+
+    speedup is relative to the same strategy and kernel with 1 worker (also relative to the single core
+    vectorized test3 for the numpy kernel), efficiency = speedup / workers.
+    The bars are the speedup curves, full width is a linear speedup at the largest worker count.
+    """
+    results = [r for r in results if r['suite'] == 'scaling']
+    if not results:
+        return
+    vectorized = {r['params']['array_size']: r['median'] for r in results if r['benchmark'] == 'vectorized'}
+    single = {(r['benchmark'], r['params']['kernel'], r['params']['array_size']): r['median']
+              for r in results if r['params'].get('workers') == 1}
+    max_workers = max(r['params'].get('workers', 1) for r in results)
+    print(f'\n{"strategy":12s} {"kernel":8s} {"workers":>7s} {"seconds":>10s} {"speedup":>8s} '
+          f'{"efficiency":>10s} {"vs vectorized":>13s}')
+    for r in results:
+        if 'workers' not in r['params']:
+            continue
+        kernel, workers, size = r['params']['kernel'], r['params']['workers'], r['params']['array_size']
+        base = single.get((r['benchmark'], kernel, size))
+        speedup = base / r['median'] if base else float('nan')
+        versus = f'{vectorized[size] / r["median"]:13.2f}' if kernel == 'numpy' and size in vectorized else ''
+        bar = '#' * round(speedup * 40 / max_workers) if speedup == speedup else ''
+        print(f'{r["benchmark"]:12s} {kernel:8s} {workers:7d} {r["median"]:10.4g} {speedup:8.2f} '
+              f'{speedup / workers:10.0%} {versus:13s} {bar}')
+
 
 if __name__ == '__main__':
-    print('\nAdding 2 random arrays of length {array_size} using multiple methods')
-
-    t0 = time.perf_counter()
-    test1()
-    t1 = time.perf_counter()
-    method_1 = t1-t0
-    print(f"\nAppending to arrays.  Completion time= {method_1}")
-
-    t0 = time.perf_counter()
-    test2()
-    t1 = time.perf_counter()
-    method_2 = t1-t0
-    print(f"\nPre-allocated arrays.  Completion time= {method_2}")
-    print(f"Increase in calculation speed compared to appending {method_1/method_2}")
-
-
-    t0 = time.perf_counter()
-    test3()
-    t1 = time.perf_counter()
-    method_3 = t1-t0
-    print(f"\nVectorized Solution.  Completion time= {method_3}")
-    print(f"Increase in calculation speed compared to appending {method_1/method_3}")
-    print(f"Increase in calculation speed compared to pre-allocating {method_2/method_3}")
+    # speedup compares each method with the first one of its suite at the same parameters
+    print_scaling(main())